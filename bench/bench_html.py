@@ -0,0 +1,116 @@
+"""Micro-benchmark da conversão HTML -> texto.
+
+Compara o caminho antigo (html.unescape + BeautifulSoup) com o extrator
+de services/html_texto.py, com e sem cache, sobre conteúdos no formato
+gravado pelo GLPI (rich text com entidades escapadas).
+
+Uso: python bench/bench_html.py [--amostras 2000] [--repeticoes 3]
+"""
+
+import argparse
+import html
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from services.html_texto import HtmlTextNormalizer, _extrair_texto  # noqa: E402
+
+PALAVRAS = (
+    "impressora servidor acesso senha usuário rede lentidão sistema erro "
+    "chamado solicitação atualização backup e-mail licença computador "
+    "configuração relatório permissão pasta compartilhada VPN"
+).split()
+
+
+def normalize_bs4(text):
+    """Implementação original de GLPIMonitor.normalize_html_text."""
+    if not text:
+        return ""
+    text = html.unescape(text)
+    soup = BeautifulSoup(text, "html.parser")
+    return soup.get_text(separator="\n").strip()
+
+
+def _frase(rng, n):
+    return " ".join(rng.choice(PALAVRAS) for _ in range(n)).capitalize()
+
+
+def gerar_conteudo(rng):
+    """Gera um conteúdo de ticket parecido com o salvo pelo editor do GLPI."""
+    blocos = []
+    for _ in range(rng.randint(1, 8)):
+        tipo = rng.random()
+        if tipo < 0.5:
+            blocos.append(f"<p>{_frase(rng, rng.randint(5, 40))}.</p>")
+        elif tipo < 0.7:
+            itens = "".join(
+                f"<li>{_frase(rng, rng.randint(2, 8))}</li>"
+                for _ in range(rng.randint(2, 5))
+            )
+            blocos.append(f"<ul>{itens}</ul>")
+        elif tipo < 0.85:
+            blocos.append(
+                f'<p><strong>{_frase(rng, 2)}:</strong> {_frase(rng, 10)}<br>'
+                f'<span style="color: #e03e2d;">{_frase(rng, 4)}</span></p>'
+            )
+        else:
+            linhas = "".join(
+                f"<tr><td>{_frase(rng, 2)}</td><td>{rng.randint(1, 999)}</td></tr>"
+                for _ in range(rng.randint(1, 4))
+            )
+            blocos.append(f'<table border="1"><tbody>{linhas}</tbody></table>')
+    # O GLPI grava o rich text com as tags escapadas
+    return html.escape("".join(blocos), quote=False)
+
+
+def medir(nome, funcao, amostras, repeticoes):
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for texto in amostras:
+            funcao(texto)
+        decorrido = time.perf_counter() - inicio
+        melhor = decorrido if melhor is None else min(melhor, decorrido)
+    por_item = melhor / len(amostras) * 1e6
+    print(f"{nome:<40} {melhor * 1000:10.1f} ms {por_item:10.1f} us/item")
+    return melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--amostras", type=int, default=2000)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument(
+        "--duplicados",
+        type=float,
+        default=0.5,
+        help="fração de conteúdos repetidos (fan-out de joins e ciclos)",
+    )
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    unicos = [gerar_conteudo(rng) for _ in range(args.amostras)]
+    amostras = [
+        rng.choice(unicos) if rng.random() < args.duplicados else unicos[i]
+        for i in range(args.amostras)
+    ]
+
+    divergentes = sum(normalize_bs4(t) != _extrair_texto(t) for t in unicos)
+    print(f"{len(unicos)} conteúdos, {divergentes} saídas divergentes\n")
+
+    base = medir("BeautifulSoup (original)", normalize_bs4, amostras, args.repeticoes)
+    rapido = medir("HTMLParser sem cache", _extrair_texto, amostras, args.repeticoes)
+    normalizer = HtmlTextNormalizer(cache_size=args.amostras)
+    cache = medir(
+        "HTMLParser + cache LRU", normalizer.normalize, amostras, args.repeticoes
+    )
+    print(f"\nGanho sem cache: {base / rapido:.1f}x | com cache: {base / cache:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""Cenários de carga do monitor contra a base gerada por bench/gerar_glpi.py.
+
+``getters``: roda ``--ciclos`` vezes cada getter do ``GLPIMonitor`` (ou o
+iterador em lotes, com ``--lote``) e mede a duração de cada ciclo,
+eventos/s e idas ao banco por ciclo.
+
+``e2e``: roda o laço do ``__main__`` do monitor por ``--duracao`` segundos
+contra o gateway falso (bench/gateway_stub.py), enquanto uma thread
+insere ``--taxa`` tickets novos por segundo, com seus acompanhamentos,
+fechamentos e aprovações.
+
+``failover``: sobe duas réplicas do monitor (``python monitor.py`` com
+``HA=1``) contra o gateway falso e, após ``--antes`` segundos de carga,
+mata a primeira com ``kill -9``. No fim compara as mensagens recebidas
+pelo gateway com as esperadas (eventos gerados durante a rodada) e conta
+duplicadas e perdidas. Sem ``--reiniciar``, as notificações que a réplica
+morta já tinha reivindicado e não enviou aparecem como perdidas; com
+``--reiniciar N`` ela volta após N segundos e reenvia o seu outbox (a
+mensagem em voo no momento do kill pode então chegar duas vezes).
+
+As idas ao banco vêm do contador global ``Questions`` do servidor,
+descontadas as consultas da própria medição e da thread de inserção. O
+pico de RSS é o do processo inteiro (inclui gateway falso e gerador);
+para isolar um getter, rode-o sozinho com ``--tipos``.
+
+Uso:
+    python bench/cenarios.py getters [--tipos tickets,followups] [--janela 1440]
+        [--ciclos 5] [--lote 500] [--incremental]
+    python bench/cenarios.py e2e [--duracao 60] [--taxa 5] [--latencia-ms 50]
+        [--erro 0.05] [--lote 500] [--incremental]
+    python bench/cenarios.py failover [--antes 20] [--depois 20] [--taxa 5]
+        [--lote 500] [--reiniciar 5]
+"""
+
+import argparse
+import logging
+import math
+import os
+import random
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.gateway_stub import GatewayStub  # noqa: E402
+from bench.gerar_glpi import (  # noqa: E402
+    Gerador,
+    adicionar_argumentos_banco,
+    agora_glpi,
+    conectar,
+    gravar,
+)
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def pico_rss_mb():
+    # ru_maxrss é em KB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def questions(conn, escopo="GLOBAL"):
+    with conn.cursor() as cursor:
+        cursor.execute(f"SHOW {escopo} STATUS LIKE 'Questions'")
+        return int(cursor.fetchone()[1])
+
+
+def config_monitor(args):
+    return {
+        "DB_HOST": args.host,
+        "DB_PORT": args.porta,
+        "DB_USER": args.usuario,
+        "DB_PASSWORD": args.senha,
+        "DB_NAME": args.banco,
+        "DB_POOL_SIZE": 4,
+    }
+
+
+def rodar_getter(glpi, getter, janela, lote):
+    """Executa um ciclo de busca e retorna quantos eventos vieram."""
+    if lote:
+        iterador = getattr(glpi, getter.replace("get_", "iter_", 1))
+        return sum(len(eventos) for eventos in iterador(janela, lote))
+    return len(getattr(glpi, getter)(janela))
+
+
+def cenario_getters(args):
+    import monitor
+    from services.checkpoint import CheckpointStore
+
+    medidor = conectar(args)
+    tipos = args.tipos.split(",") if args.tipos else list(monitor.EVENT_TYPES)
+    print(
+        f"{'tipo':<12} {'eventos':>8} {'ev/s':>9} {'1º ciclo':>9} {'p50':>8} "
+        f"{'p95':>8} {'p99':>8} {'idas/ciclo':>10} {'RSS MB':>8}"
+    )
+    with tempfile.TemporaryDirectory() as diretorio:
+        for event_type in tipos:
+            checkpoints = None
+            if args.incremental:
+                checkpoints = CheckpointStore(os.path.join(diretorio, f"{event_type}.json"))
+            glpi = monitor.GLPIMonitor(config_monitor(args), checkpoints=checkpoints)
+            getter = monitor.EVENT_TYPES[event_type][0]
+            duracoes, idas, eventos = [], [], 0
+            for _ in range(args.ciclos):
+                antes = questions(medidor)
+                inicio = time.perf_counter()
+                eventos += rodar_getter(glpi, getter, args.janela, args.lote)
+                duracoes.append(time.perf_counter() - inicio)
+                # -1: o próprio SHOW STATUS de antes
+                idas.append(questions(medidor) - antes - 1)
+                glpi.confirm_checkpoints()
+            glpi.pool.close()
+            total = sum(duracoes)
+            print(
+                f"{event_type:<12} {eventos:>8} {eventos / total:>9.1f} "
+                f"{duracoes[0] * 1000:>7.0f}ms {percentil(duracoes, 50) * 1000:>6.0f}ms "
+                f"{percentil(duracoes, 95) * 1000:>6.0f}ms {percentil(duracoes, 99) * 1000:>6.0f}ms "
+                f"{sum(idas) / len(idas):>10.1f} {pico_rss_mb():>8.1f}"
+            )
+    medidor.close()
+
+
+class Insercao(threading.Thread):
+    """Insere tickets novos continuamente, simulando uso do GLPI."""
+
+    def __init__(self, args):
+        super().__init__(name="insercao", daemon=True)
+        self.taxa = args.taxa
+        self.conn = conectar(args)
+        self.gerador = Gerador(random.Random(args.semente), args.usuarios, conteudos=500)
+        self.gerador.continuar(self.conn)
+        self.parar = threading.Event()
+        self.inseridos = 0
+
+    def run(self):
+        while not self.parar.wait(1.0):
+            gravar(self.conn, self.gerador.atividade(self.taxa))
+            self.inseridos += self.taxa
+
+    def questions(self):
+        return questions(self.conn, "SESSION")
+
+
+def cenario_e2e(args):
+    stub = GatewayStub(0, args.latencia_ms, args.jitter_ms, args.erro).iniciar()
+    diretorio = tempfile.mkdtemp(prefix="bench_monitor_")
+    # Precisa estar no ambiente antes do import, e o load_dotenv do
+    # monitor não sobrescreve variáveis já definidas
+    ambiente = {
+        "API_URL_NOTIFICACAO": f"{stub.url}/api/v1/notificacao",
+        "DB_HOST": args.host,
+        "DB_PORT": str(args.porta),
+        "DB_USER": args.usuario,
+        "DB_PASSWORD": args.senha,
+        "DB_NAME": args.banco,
+        "CHECKPOINT_FILE": os.path.join(diretorio, "checkpoints.json") if args.incremental else "",
+        "OUTBOX_FILE": os.path.join(diretorio, "outbox.db") if args.outbox else "",
+        "COLETA_LOTE": str(args.lote or ""),
+        "INTERVALO_MIN": str(args.intervalo_min),
+        "INTERVALO_MAX": str(args.intervalo_max),
+        "METRICS_PORT": "",
+    }
+    for event_type in ("followups", "tickets", "closures", "validations"):
+        ambiente[f"INTERVALO_{event_type.upper()}"] = str(args.intervalo_min)
+    os.environ.update(ambiente)
+
+    import monitor
+    from services import metricas
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    agendadores = []
+
+    class SchedulerMedido(monitor.Scheduler):
+        def __init__(self, *a, **kw):
+            super().__init__(*a, **kw)
+            agendadores.append(self)
+
+    monitor.Scheduler = SchedulerMedido
+
+    medidor = conectar(args)
+    insercao = Insercao(args)
+    antes = questions(medidor)
+    inicio = time.perf_counter()
+    insercao.start()
+    laco = threading.Thread(target=monitor.__main__, name="monitor", daemon=True)
+    laco.start()
+    time.sleep(args.duracao)
+    insercao.parar.set()
+    insercao.join()
+    for scheduler in agendadores:
+        scheduler.stop()
+    laco.join(timeout=args.duracao)
+    duracao = time.perf_counter() - inicio
+    idas = questions(medidor) - antes - 1 - insercao.questions()
+
+    eventos = sum(metricas.EVENTS.valores().values())
+    ciclos = sum(total for total, _ in metricas.CYCLE_SECONDS.resumo().values())
+    print(f"Duração: {duracao:.1f}s, {insercao.inseridos} tickets inseridos")
+    print(f"Eventos: {eventos} ({eventos / duracao:.1f}/s) em {ciclos} ciclos")
+    for q in (0.5, 0.95, 0.99):
+        valor = metricas.CYCLE_SECONDS.quantil(q)
+        print(f"Ciclo p{int(q * 100)}: {valor * 1000 if valor else 0:.0f}ms")
+    print(f"Idas ao banco: {idas} ({idas / max(ciclos, 1):.1f} por ciclo)")
+    print(f"Atraso (s) por tipo: {metricas.LAG_SECONDS.valores()}")
+    envio = metricas.NOTIFICATION_SECONDS.quantil(0.95)
+    print(
+        f"Gateway: {stub.stats()}, envio p95 {envio * 1000 if envio else 0:.0f}ms, "
+        f"status {metricas.NOTIFICATION_RESPONSES.valores()}"
+    )
+    print(f"Pico de RSS: {pico_rss_mb():.1f} MB")
+    medidor.close()
+    stub.parar()
+
+
+def aguardar_locks(conn, nomes, limite):
+    """Segundos até todos os locks ``nomes`` estarem com alguma réplica."""
+    inicio = time.perf_counter()
+    marcadores = ", ".join(["IS_USED_LOCK(%s)"] * len(nomes))
+    while time.perf_counter() - inicio < limite:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT {marcadores}", nomes)
+            if all(valor is not None for valor in cursor.fetchone()):
+                return time.perf_counter() - inicio
+        time.sleep(0.1)
+    return None
+
+
+def mensagens_esperadas(args, desde, minutos):
+    """Pares ``(phone, mensagem)`` dos eventos com data a partir de ``desde``."""
+    import monitor
+
+    glpi = monitor.GLPIMonitor(config_monitor(args))
+    esperadas = set()
+    for getter, *_ in monitor.EVENT_TYPES.values():
+        for evento in getattr(glpi, getter)(minutos):
+            if evento.date is not None and evento.date >= desde:
+                mensagem = monitor.montar_mensagem(evento)
+                esperadas.update((phone, mensagem) for phone in evento.recipients)
+    glpi.pool.close()
+    return esperadas
+
+
+def cenario_failover(args):
+    from services.lideranca import _prefixo_lock
+
+    stub = GatewayStub(0, args.latencia_ms, args.jitter_ms, args.erro).iniciar()
+    diretorio = tempfile.mkdtemp(prefix="bench_failover_")
+    medidor = conectar(args)
+    with medidor.cursor() as cursor:
+        # Cada rodada começa sem posições nem envios de rodadas anteriores
+        cursor.execute("DROP TABLE IF EXISTS db_monitor_checkpoints, db_monitor_envios")
+    medidor.commit()
+    os.environ["GLPI_URL"] = "http://glpi.bench"
+    ambiente = {
+        **os.environ,
+        "API_URL_NOTIFICACAO": f"{stub.url}/api/v1/notificacao",
+        "DB_HOST": args.host,
+        "DB_PORT": str(args.porta),
+        "DB_USER": args.usuario,
+        "DB_PASSWORD": args.senha,
+        "DB_NAME": args.banco,
+        "HA": "1",
+        "HA_INTERVALO": str(args.ha_intervalo),
+        "CHECKPOINT_FILE": "",
+        "CAPTURA": "",
+        "INSTANCIAS_FILE": "",
+        "COLETA_LOTE": str(args.lote or ""),
+        "INTERVALO_MIN": str(args.intervalo_min),
+        "INTERVALO_MAX": str(args.intervalo_max),
+        # Sem agrupamento: o gateway conta cada notificação pelo texto
+        "NOTIFICACAO_JANELA": "0",
+        "NOTIFICACAO_LIMITE_TELEFONE": "0",
+        "NOTIFICACAO_LIMITE_GLOBAL": "0",
+        "METRICS_PORT": "",
+    }
+    for event_type in ("followups", "tickets", "closures", "validations"):
+        ambiente[f"INTERVALO_{event_type.upper()}"] = str(args.intervalo_min)
+
+    def iniciar_replica(n):
+        with open(os.path.join(diretorio, f"replica{n}.log"), "a") as log:
+            return subprocess.Popen(
+                [sys.executable, os.path.join(RAIZ, "monitor.py")],
+                cwd=RAIZ,
+                env={**ambiente, "OUTBOX_FILE": os.path.join(diretorio, f"outbox{n}.db")},
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+
+    prefixo = _prefixo_lock(f"dbm:{args.banco}:")
+    locks = tuple(
+        f"{prefixo}:{tipo}" for tipo in ("followups", "tickets", "closures", "validations")
+    )
+    desde = agora_glpi()
+    insercao = Insercao(args)
+    inicio = time.perf_counter()
+    insercao.start()
+    replicas = [iniciar_replica(0)]
+    # A primeira réplica fica com o slot 0 e assume os tipos antes da segunda
+    time.sleep(2 * args.ha_intervalo)
+    replicas.append(iniciar_replica(1))
+    time.sleep(args.antes)
+    os.kill(replicas[0].pid, signal.SIGKILL)
+    replicas[0].wait()
+    morte = time.perf_counter()
+    print(f"Réplica 0 morta com kill -9 após {morte - inicio:.1f}s")
+    failover = aguardar_locks(medidor, locks, args.depois)
+    if failover is None:
+        print(f"Os tipos da réplica morta não foram assumidos em {args.depois:.0f}s")
+    else:
+        print(f"Tipos reassumidos pela réplica 1 em {failover:.1f}s")
+    if args.reiniciar:
+        time.sleep(args.reiniciar)
+        replicas[0] = iniciar_replica(0)
+        print("Réplica 0 reiniciada com o mesmo outbox")
+    time.sleep(max(0.0, morte + args.depois - time.perf_counter()))
+    insercao.parar.set()
+    insercao.join()
+    # Tempo para o líder ler os últimos eventos e o dispatcher esvaziar a fila
+    time.sleep(args.drenagem)
+    for replica in replicas:
+        replica.terminate()
+        replica.wait(timeout=30)
+    duracao = time.perf_counter() - inicio
+
+    esperadas = mensagens_esperadas(args, desde, math.ceil(duracao / 60) + 1)
+    recebidas = stub.mensagens()
+    stats = stub.stats()
+    print(f"Duração: {duracao:.1f}s, {insercao.inseridos} tickets inseridos")
+    print(f"Gateway: {stats}")
+    print(
+        f"Notificações esperadas: {len(esperadas)}, entregues: {len(esperadas & recebidas)}, "
+        f"perdidas: {len(esperadas - recebidas)}, duplicadas: {stats['duplicadas']}"
+    )
+    print(f"Logs das réplicas em {diretorio}")
+    medidor.close()
+    stub.parar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="cenario", required=True)
+    getters = subparsers.add_parser("getters")
+    e2e = subparsers.add_parser("e2e")
+    failover = subparsers.add_parser("failover")
+    for sub in (getters, e2e, failover):
+        adicionar_argumentos_banco(sub)
+        sub.add_argument("--lote", type=int, default=0, help="0 = getter sem paginação")
+    for sub in (getters, e2e):
+        sub.add_argument("--incremental", action="store_true")
+    getters.add_argument("--tipos", default="")
+    getters.add_argument("--janela", type=int, default=60, help="minutos")
+    getters.add_argument("--ciclos", type=int, default=5)
+    e2e.add_argument("--duracao", type=float, default=60)
+    for sub in (e2e, failover):
+        sub.add_argument("--taxa", type=int, default=5, help="tickets inseridos por segundo")
+        sub.add_argument("--usuarios", type=int, default=2000)
+        sub.add_argument("--semente", type=int, default=7)
+        sub.add_argument("--latencia-ms", type=float, default=50.0)
+        sub.add_argument("--jitter-ms", type=float, default=0.0)
+        sub.add_argument("--erro", type=float, default=0.0)
+    e2e.add_argument("--intervalo-min", type=float, default=5)
+    e2e.add_argument("--intervalo-max", type=float, default=60)
+    e2e.add_argument("--outbox", action="store_true")
+    e2e.add_argument("--verbose", action="store_true")
+    failover.add_argument("--antes", type=float, default=20, help="segundos até o kill -9")
+    failover.add_argument(
+        "--depois", type=float, default=20, help="segundos de carga após o kill -9"
+    )
+    failover.add_argument(
+        "--drenagem", type=float, default=15, help="segundos sem carga antes de encerrar"
+    )
+    failover.add_argument(
+        "--reiniciar",
+        type=float,
+        default=0,
+        help="segundos após o kill para reiniciar a réplica (0 = não reinicia)",
+    )
+    failover.add_argument("--ha-intervalo", type=float, default=1)
+    failover.add_argument("--intervalo-min", type=float, default=2)
+    failover.add_argument("--intervalo-max", type=float, default=10)
+    args = parser.parse_args()
+    if args.cenario == "getters":
+        cenario_getters(args)
+    elif args.cenario == "e2e":
+        cenario_e2e(args)
+    else:
+        cenario_failover(args)
+
+
+if __name__ == "__main__":
+    main()
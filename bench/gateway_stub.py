@@ -0,0 +1,113 @@
+"""Gateway de notificações falso para os benchmarks.
+
+Responde ao ``POST .../mensagem`` do monitor com latência e taxa de erro
+configuráveis e conta as requisições recebidas e as mensagens entregues
+mais de uma vez (mesmo telefone e texto). Pode rodar sozinho ou ser
+iniciado dentro de bench/cenarios.py.
+
+Uso: python bench/gateway_stub.py [--porta 3030] [--latencia-ms 50] [--erro 0.05]
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class GatewayStub:
+    """Servidor HTTP que simula a API de notificação."""
+
+    def __init__(self, porta=0, latencia_ms=50.0, jitter_ms=0.0, erro=0.0, host="127.0.0.1"):
+        self.latencia = latencia_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.erro = erro
+        self._lock = threading.Lock()
+        self.recebidas = 0
+        self.erros = 0
+        self.telefones = set()
+        self.entregues = Counter()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                corpo = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                time.sleep(max(0.0, stub.latencia + random.uniform(-1, 1) * stub.jitter))
+                falhou = random.random() < stub.erro
+                with stub._lock:
+                    stub.recebidas += 1
+                    if falhou:
+                        stub.erros += 1
+                    else:
+                        try:
+                            dados = json.loads(corpo)
+                        except ValueError:
+                            dados = {}
+                        stub.telefones.add(dados.get("phone"))
+                        stub.entregues[(dados.get("phone"), dados.get("message"))] += 1
+                resposta = b'{"erro": true}' if falhou else b'{"ok": true}'
+                self.send_response(500 if falhou else 200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(resposta)))
+                self.end_headers()
+                self.wfile.write(resposta)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer((host, porta), Handler)
+        self.servidor.daemon_threads = True
+
+    @property
+    def url(self):
+        host, porta = self.servidor.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def iniciar(self):
+        threading.Thread(
+            target=self.servidor.serve_forever, name="gateway-stub", daemon=True
+        ).start()
+        return self
+
+    def parar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "recebidas": self.recebidas,
+                "erros": self.erros,
+                "telefones": len(self.telefones),
+                "duplicadas": sum(n - 1 for n in self.entregues.values()),
+            }
+
+    def mensagens(self):
+        """Pares ``(phone, mensagem)`` entregues com sucesso."""
+        with self._lock:
+            return set(self.entregues)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--porta", type=int, default=3030)
+    parser.add_argument("--latencia-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--erro", type=float, default=0.0, help="fração de respostas 500")
+    args = parser.parse_args()
+
+    stub = GatewayStub(args.porta, args.latencia_ms, args.jitter_ms, args.erro, args.host)
+    print(f"Gateway falso em {stub.url}/api/v1/notificacao/mensagem")
+    try:
+        stub.servidor.serve_forever()
+    except KeyboardInterrupt:
+        print(stub.stats())
+
+
+if __name__ == "__main__":
+    main()
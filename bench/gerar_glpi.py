@@ -0,0 +1,361 @@
+"""Gera uma base GLPI sintética para os benchmarks do monitor.
+
+Cria apenas as tabelas e colunas usadas pelas consultas do monitor, com
+os índices que o GLPI cria por padrão, e popula com ``--tickets`` tickets
+espalhados pelos últimos ``--dias`` dias. Cada ticket recebe solicitante
+e técnico, acompanhamentos, soluções (nos fechados) e aprovações, com
+conteúdo rich text no formato gravado pelo GLPI.
+
+Suba o MariaDB de bench/docker-compose.yml antes de rodar.
+
+Uso: python bench/gerar_glpi.py [--tickets 10000] [--usuarios 2000] [--dias 30]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pymysql  # noqa: E402
+import pytz  # noqa: E402
+
+from bench.bench_html import gerar_conteudo  # noqa: E402
+
+ESQUEMA = [
+    """
+    CREATE TABLE glpi_users (
+        id INT UNSIGNED NOT NULL AUTO_INCREMENT,
+        name VARCHAR(255),
+        firstname VARCHAR(255),
+        realname VARCHAR(255),
+        phone VARCHAR(255),
+        date_mod TIMESTAMP NULL,
+        PRIMARY KEY (id),
+        KEY date_mod (date_mod)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE glpi_useremails (
+        id INT UNSIGNED NOT NULL AUTO_INCREMENT,
+        users_id INT UNSIGNED NOT NULL DEFAULT 0,
+        is_default TINYINT NOT NULL DEFAULT 0,
+        email VARCHAR(255),
+        PRIMARY KEY (id),
+        UNIQUE KEY unicity (users_id, email),
+        KEY is_default (is_default)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE glpi_tickets (
+        id INT UNSIGNED NOT NULL AUTO_INCREMENT,
+        name VARCHAR(255),
+        date_creation TIMESTAMP NULL,
+        date_mod TIMESTAMP NULL,
+        status INT NOT NULL DEFAULT 1,
+        content LONGTEXT,
+        PRIMARY KEY (id),
+        KEY date_creation (date_creation),
+        KEY date_mod (date_mod),
+        KEY status (status)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE glpi_tickets_users (
+        id INT UNSIGNED NOT NULL AUTO_INCREMENT,
+        tickets_id INT UNSIGNED NOT NULL DEFAULT 0,
+        users_id INT UNSIGNED NOT NULL DEFAULT 0,
+        type INT NOT NULL DEFAULT 1,
+        PRIMARY KEY (id),
+        UNIQUE KEY unicity (tickets_id, type, users_id),
+        KEY user (users_id, type)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE glpi_itilfollowups (
+        id INT UNSIGNED NOT NULL AUTO_INCREMENT,
+        itemtype VARCHAR(100) NOT NULL,
+        items_id INT UNSIGNED NOT NULL DEFAULT 0,
+        date_creation TIMESTAMP NULL,
+        users_id INT UNSIGNED NOT NULL DEFAULT 0,
+        content LONGTEXT,
+        is_private TINYINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (id),
+        KEY item_id (items_id),
+        KEY item (itemtype, items_id),
+        KEY date_creation (date_creation),
+        KEY is_private (is_private)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE glpi_itilsolutions (
+        id INT UNSIGNED NOT NULL AUTO_INCREMENT,
+        itemtype VARCHAR(100) NOT NULL,
+        items_id INT UNSIGNED NOT NULL DEFAULT 0,
+        content LONGTEXT,
+        date_creation TIMESTAMP NULL,
+        PRIMARY KEY (id),
+        KEY item (itemtype, items_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE glpi_ticketvalidations (
+        id INT UNSIGNED NOT NULL AUTO_INCREMENT,
+        tickets_id INT UNSIGNED NOT NULL DEFAULT 0,
+        users_id INT UNSIGNED NOT NULL DEFAULT 0,
+        users_id_validate INT UNSIGNED NOT NULL DEFAULT 0,
+        comment_submission TEXT,
+        submission_date TIMESTAMP NULL,
+        status INT NOT NULL DEFAULT 2,
+        PRIMARY KEY (id),
+        KEY tickets_id (tickets_id),
+        KEY users_id_validate (users_id_validate),
+        KEY submission_date (submission_date),
+        KEY status (status)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+]
+
+TABELAS = [
+    "glpi_users",
+    "glpi_useremails",
+    "glpi_tickets",
+    "glpi_tickets_users",
+    "glpi_itilfollowups",
+    "glpi_itilsolutions",
+    "glpi_ticketvalidations",
+]
+
+NOMES = (
+    "Ana Bruno Carla Daniel Eduarda Felipe Gabriela Henrique Isabela João "
+    "Karina Lucas Mariana Nicolas Olivia Paulo Renata Sergio Tatiana Vitor"
+).split()
+SOBRENOMES = (
+    "Silva Souza Oliveira Santos Lima Pereira Costa Rodrigues Almeida "
+    "Nascimento Carvalho Araujo Ribeiro Gomes Martins Rocha"
+).split()
+
+
+def agora_glpi():
+    """Horário atual como o GLPI grava: local de São Paulo, sem fuso."""
+    return datetime.now(pytz.timezone("America/Sao_Paulo")).replace(
+        tzinfo=None, microsecond=0
+    )
+
+
+def conectar(args):
+    return pymysql.connect(
+        host=args.host,
+        port=args.porta,
+        user=args.usuario,
+        password=args.senha,
+        database=args.banco,
+        autocommit=False,
+    )
+
+
+def criar_esquema(conn):
+    """Recria as tabelas do GLPI usadas pelo monitor."""
+    with conn.cursor() as cursor:
+        for tabela in TABELAS:
+            cursor.execute(f"DROP TABLE IF EXISTS {tabela}")
+        for ddl in ESQUEMA:
+            cursor.execute(ddl)
+    conn.commit()
+
+
+class Gerador:
+    """Produz as linhas sintéticas, com ids atribuídos localmente.
+
+    Os conteúdos vêm de um conjunto de ``conteudos`` textos distintos,
+    como numa base real em que muitos tickets repetem modelos.
+    """
+
+    def __init__(self, rng, usuarios, conteudos=5000):
+        self.rng = rng
+        self.usuarios = usuarios
+        self.conteudos = [gerar_conteudo(rng) for _ in range(conteudos)]
+        self.proximo = {
+            "ticket": 1,
+            "followup": 1,
+            "solution": 1,
+            "validation": 1,
+        }
+
+    def continuar(self, conn):
+        """Segue a numeração a partir dos ids já existentes no banco."""
+        tabelas = {
+            "ticket": "glpi_tickets",
+            "followup": "glpi_itilfollowups",
+            "solution": "glpi_itilsolutions",
+            "validation": "glpi_ticketvalidations",
+        }
+        with conn.cursor() as cursor:
+            for tipo, tabela in tabelas.items():
+                cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabela}")
+                self.proximo[tipo] = cursor.fetchone()[0] + 1
+        conn.commit()
+
+    def atividade(self, quantidade):
+        """Gera ``quantidade`` tickets novos com data atual, com seus eventos."""
+        agora = agora_glpi()
+        linhas = {tabela: [] for tabela in TABELAS}
+        for _ in range(quantidade):
+            for tabela, rows in self.ticket(agora, agora).items():
+                linhas[tabela].extend(rows)
+        return linhas
+
+    def _id(self, tipo):
+        valor = self.proximo[tipo]
+        self.proximo[tipo] += 1
+        return valor
+
+    def _usuario(self):
+        return self.rng.randint(1, self.usuarios)
+
+    def _conteudo(self):
+        return self.rng.choice(self.conteudos)
+
+    def usuarios_linhas(self, agora):
+        usuarios, emails = [], []
+        for users_id in range(1, self.usuarios + 1):
+            nome = self.rng.choice(NOMES)
+            sobrenome = self.rng.choice(SOBRENOMES)
+            phone = f"5511{self.rng.randint(900000000, 999999999)}"
+            date_mod = agora - timedelta(minutes=self.rng.randint(0, 60 * 24 * 365))
+            usuarios.append(
+                (users_id, f"{nome.lower()}.{users_id}", nome, sobrenome, phone, date_mod)
+            )
+            emails.append((users_id, 1, f"{nome.lower()}.{users_id}@exemplo.com.br"))
+        return usuarios, emails
+
+    def ticket(self, date_creation, agora):
+        """Gera um ticket e as linhas relacionadas a ele, por tabela."""
+        rng = self.rng
+        ticket_id = self._id("ticket")
+        linhas = {tabela: [] for tabela in TABELAS}
+        solicitantes = {self._usuario() for _ in range(1 if rng.random() < 0.9 else 2)}
+        for users_id in solicitantes:
+            linhas["glpi_tickets_users"].append((ticket_id, users_id, 1))
+        if rng.random() < 0.85:
+            linhas["glpi_tickets_users"].append((ticket_id, self._usuario(), 2))
+        ultima = date_creation
+        for _ in range(rng.choice((0, 0, 1, 1, 2, 3, 5))):
+            ultima = min(agora, ultima + timedelta(minutes=rng.randint(1, 600)))
+            linhas["glpi_itilfollowups"].append(
+                (
+                    self._id("followup"),
+                    "Ticket",
+                    ticket_id,
+                    ultima,
+                    self._usuario(),
+                    self._conteudo(),
+                    1 if rng.random() < 0.1 else 0,
+                )
+            )
+        status = rng.choice((1, 2, 2, 3, 4, 5, 6, 6, 6, 6))
+        if status in (5, 6):
+            for _ in range(1 if rng.random() < 0.9 else 2):
+                ultima = min(agora, ultima + timedelta(minutes=rng.randint(1, 600)))
+                linhas["glpi_itilsolutions"].append(
+                    (self._id("solution"), "Ticket", ticket_id, self._conteudo(), ultima)
+                )
+        if rng.random() < 0.1:
+            submission = min(agora, date_creation + timedelta(minutes=rng.randint(1, 60)))
+            linhas["glpi_ticketvalidations"].append(
+                (
+                    self._id("validation"),
+                    ticket_id,
+                    self._usuario(),
+                    self._usuario(),
+                    self._conteudo(),
+                    submission,
+                    rng.choice((2, 2, 3, 4)),
+                )
+            )
+            ultima = max(ultima, submission)
+        linhas["glpi_tickets"].append(
+            (
+                ticket_id,
+                f"Chamado {ticket_id} - {rng.choice(NOMES)}",
+                date_creation,
+                ultima,
+                status,
+                self._conteudo(),
+            )
+        )
+        return linhas
+
+
+INSERTS = {
+    "glpi_users": "INSERT INTO glpi_users (id, name, firstname, realname, phone, date_mod) VALUES (%s, %s, %s, %s, %s, %s)",
+    "glpi_useremails": "INSERT INTO glpi_useremails (users_id, is_default, email) VALUES (%s, %s, %s)",
+    "glpi_tickets": "INSERT INTO glpi_tickets (id, name, date_creation, date_mod, status, content) VALUES (%s, %s, %s, %s, %s, %s)",
+    "glpi_tickets_users": "INSERT INTO glpi_tickets_users (tickets_id, users_id, type) VALUES (%s, %s, %s)",
+    "glpi_itilfollowups": "INSERT INTO glpi_itilfollowups (id, itemtype, items_id, date_creation, users_id, content, is_private) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+    "glpi_itilsolutions": "INSERT INTO glpi_itilsolutions (id, itemtype, items_id, content, date_creation) VALUES (%s, %s, %s, %s, %s)",
+    "glpi_ticketvalidations": "INSERT INTO glpi_ticketvalidations (id, tickets_id, users_id, users_id_validate, comment_submission, submission_date, status) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+}
+
+
+def gravar(conn, linhas):
+    """Insere as linhas acumuladas por tabela e confirma a transação."""
+    with conn.cursor() as cursor:
+        for tabela in TABELAS:
+            if linhas.get(tabela):
+                cursor.executemany(INSERTS[tabela], linhas[tabela])
+    conn.commit()
+
+
+def popular(conn, gerador, tickets, dias, lote=5000):
+    """Insere ``tickets`` tickets com datas nos últimos ``dias`` dias."""
+    agora = agora_glpi()
+    usuarios, emails = gerador.usuarios_linhas(agora)
+    gravar(conn, {"glpi_users": usuarios, "glpi_useremails": emails})
+    inicio = agora - timedelta(days=dias)
+    passo = (agora - inicio) / max(tickets, 1)
+    acumulado = {tabela: [] for tabela in TABELAS}
+    comeco = time.perf_counter()
+    for i in range(tickets):
+        for tabela, rows in gerador.ticket(inicio + passo * i, agora).items():
+            acumulado[tabela].extend(rows)
+        if (i + 1) % lote == 0 or i + 1 == tickets:
+            gravar(conn, acumulado)
+            acumulado = {tabela: [] for tabela in TABELAS}
+            decorrido = time.perf_counter() - comeco
+            print(f"{i + 1}/{tickets} tickets ({(i + 1) / decorrido:.0f}/s)", flush=True)
+
+
+def adicionar_argumentos_banco(parser):
+    """Argumentos de conexão com o MariaDB de benchmark."""
+    parser.add_argument("--host", default=os.getenv("BENCH_DB_HOST", "127.0.0.1"))
+    parser.add_argument("--porta", type=int, default=int(os.getenv("BENCH_DB_PORT", 3307)))
+    parser.add_argument("--usuario", default=os.getenv("BENCH_DB_USER", "root"))
+    parser.add_argument("--senha", default=os.getenv("BENCH_DB_PASSWORD", "bench"))
+    parser.add_argument("--banco", default=os.getenv("BENCH_DB_NAME", "glpi_bench"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    adicionar_argumentos_banco(parser)
+    parser.add_argument("--tickets", type=int, default=10000)
+    parser.add_argument("--usuarios", type=int, default=2000)
+    parser.add_argument("--dias", type=float, default=30)
+    parser.add_argument("--lote", type=int, default=5000)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    conn = conectar(args)
+    try:
+        criar_esquema(conn)
+        gerador = Gerador(random.Random(args.semente), args.usuarios)
+        popular(conn, gerador, args.tickets, args.dias, args.lote)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
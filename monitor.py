@@ -1,38 +1,160 @@
+import argparse
+import json
+import threading
 import time
 import pytz
 import os
 import logging
 from dotenv import load_dotenv
 import pymysql
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-import html
-from bs4 import BeautifulSoup
+from services.agendador import Scheduler
+from services.diretorio import UserDirectory
+from services.dispatcher import NotificationDispatcher
+from services.eventos import EventAggregator
+from services.html_texto import html_para_texto
+from services import captura, metricas
+from services.pool_conexoes import ConnectionPool
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
 
+# Colunas de id de usuário das consultas -> colunas de nome/telefone preenchidas
+# a partir do diretório de usuários
+CONTACT_COLUMNS = {
+    "requester_id": ("requester_name", "phone"),
+    "technician_id": ("technician_name", None),
+    "author_id": ("author_name", None),
+    "validator_id": ("validator_name", "validator_phone"),
+}
+
+# Com log em DEBUG, registra o detalhe de 1 a cada LOG_AMOSTRA eventos
+LOG_AMOSTRA = max(1, int(os.getenv("LOG_AMOSTRA") or 10))
+
+
+def _ids_filter(column, ids):
+    """Filtro ``column IN (...)`` para os ids informados."""
+    marcadores = ", ".join(["%s"] * len(ids))
+    return f"{column} IN ({marcadores})", tuple(ids)
+
+
+def _keyset(keys, after, descending, inclusive):
+    """Filtro de paginação por chave: linhas a partir de ``after`` na ordenação."""
+    maior = "<" if descending else ">"
+    coluna, ultimo = keys[-1][0], after[-1]
+    condicao = f"{coluna} {maior}{'=' if inclusive else ''} %s"
+    params = (ultimo,)
+    # (a, b) > (x, y) expandido, para o otimizador usar o índice
+    for (coluna, _), valor in zip(reversed(keys[:-1]), reversed(after[:-1])):
+        condicao = f"({coluna} {maior} %s OR ({coluna} = %s AND {condicao}))"
+        params = (valor, valor) + params
+    return condicao, params
+
+
+@dataclass
+class EventQuery:
+    """Consulta de eventos montada pelo ``GLPIMonitor``.
+
+    ``keys`` são os pares ``(coluna, campo da linha)`` da ordenação, que
+    identificam o evento de cada linha; com eles a consulta é lida em
+    páginas (``render(after, limit)``) em vez de um cursor aberto.
+    """
+
+    select: str
+    where: str
+    params: tuple
+    keys: tuple
+    descending: bool = False
+
+    def render(self, after=None, limit=None, inclusive=True):
+        """Retorna ``(sql, params)``, a partir da chave ``after`` se houver.
+
+        A página seguinte inclui o último evento da anterior (``inclusive``),
+        cujas linhas podem ter sido cortadas pelo ``LIMIT``; o agregador de
+        eventos junta as linhas repetidas.
+        """
+        where, params = self.where, tuple(self.params)
+        if after is not None:
+            condicao, extras = _keyset(self.keys, after, self.descending, inclusive)
+            where = f"({where}) AND {condicao}"
+            params += extras
+        direcao = "DESC" if self.descending else "ASC"
+        order = ", ".join(f"{coluna} {direcao}" for coluna, _ in self.keys)
+        sql = f"{self.select}\n            WHERE {where}\n            ORDER BY {order}"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return sql, params
+
+    def render_event(self, key):
+        """Retorna ``(sql, params)`` de todas as linhas do evento com a chave ``key``."""
+        condicao = " AND ".join(f"{coluna} = %s" for coluna, _ in self.keys)
+        return (
+            f"{self.select}\n            WHERE ({self.where}) AND {condicao}",
+            tuple(self.params) + tuple(key),
+        )
+
+    def key(self, row):
+        """Chave de ordenação da linha."""
+        return tuple(row[campo] for _, campo in self.keys)
+
+
 class GLPIMonitor:
     """Monitora o banco de dados do GLPI em busca de novos tickets e acompanhamentos."""
 
     @staticmethod
-    def normalize_html_text(text):
-        if not text:
-            return ""
-        text = html.unescape(text)
-        soup = BeautifulSoup(text, "html.parser")
-        texto_formatado = soup.get_text(separator="\n")
-        return texto_formatado.strip()
-
-    def __init__(self, config):
+    def normalize_html_text(text, max_length=None):
+        return html_para_texto(text, max_length)
+
+    def __init__(self, config, checkpoints=None):
+        # Nome da instância do GLPI no modo multi-instância ("" se única)
+        self.tenant = config.get("NOME") or ""
+        self.glpi_url = config.get("GLPI_URL")
+        self.checkpoints = checkpoints
+        self.max_text_length = int(config.get("TEXTO_MAX") or 0) or None
+        # Idade mínima, em segundos, de um ticket lido no modo incremental
+        self.settle_seconds = float(config.get("COLETA_ESPERA") or 10)
         self.db_config = {
             "host": config["DB_HOST"],
+            "port": int(config.get("DB_PORT") or 3306),
             "user": config["DB_USER"],
             "password": config["DB_PASSWORD"],
             "database": config["DB_NAME"],
             "cursorclass": pymysql.cursors.DictCursor,
+            # As conexões voltam ao pool e são reaproveitadas: sem autocommit,
+            # a transação aberta pela primeira leitura manteria o mesmo
+            # snapshot (REPEATABLE READ) e as linhas novas nunca apareceriam
+            "autocommit": True,
         }
+        if config.get("DB_READ_TIMEOUT"):
+            self.db_config["read_timeout"] = int(config["DB_READ_TIMEOUT"])
+        self.directory = UserDirectory(
+            max_size=int(config.get("DIRETORIO_MAX") or 50000),
+            refresh_seconds=float(config.get("DIRETORIO_TTL") or 300),
+        )
+        self.pool = ConnectionPool(
+            self.db_config,
+            size=int(config.get("DB_POOL_SIZE") or 4),
+            max_idle_seconds=float(config.get("DB_POOL_MAX_IDLE") or 300),
+        )
+        # Data do evento mais recente visto de cada tipo, para medir o atraso
+        self.newest_event = {}
+        # Consultas que falharam por tipo: a janela de tempo não avança
+        # sobre uma busca que não leu tudo
+        self.query_failures = {}
+        # Sem checkpoints nem outbox, as janelas de tempo se sobrepõem: as
+        # chaves já notificadas ficam aqui, por tipo, com a data do evento
+        # (só dos tipos buscados por janela, ver criar_tarefa)
+        self.notified_keys = {}
+        self._notified_lock = threading.Lock()
+        # Posição na tabela de captura quando não há checkpoints em disco
+        self.capture_position = None
+        # Eleição de líder entre réplicas (modo HA) e registro compartilhado
+        # das notificações reivindicadas, ver ativar_ha
+        self.eleicao = None
+        self.envios = None
         self.status_map = {
             1: "Novo",
             2: "Processando (atribuído)",
@@ -43,369 +165,1252 @@ class GLPIMonitor:
         }
 
     def _get_db_connection(self):
-        """Estabelece uma conexão com o banco de dados."""
+        """Retira uma conexão do pool do banco de dados."""
         try:
-            return pymysql.connect(**self.db_config)
+            return self.pool.acquire()
         except pymysql.MySQLError as e:
             logging.error(f"Erro ao conectar ao banco de dados GLPI: {e}")
             return None
 
-    def get_new_tickets(self, interval_minutes=3):
-        """Busca por novos tickets criados no intervalo de tempo."""
+    def _release_db_connection(self, conn):
+        """Devolve a conexão ao pool; conexões quebradas são descartadas."""
+        self.pool.release(conn)
+
+    def pool_stats(self):
+        """Retorna as estatísticas do pool de conexões."""
+        return self.pool.stats()
+
+    def _checkpoint_position(self, cursor, event_type, bootstrap_sql, time_threshold):
+        """Retorna o último id processado do tipo de evento no modo incremental.
+
+        Sem checkpoint salvo, a posição inicial é o maior id anterior à janela
+        de tempo, para que a primeira execução se comporte como o modo antigo.
+        Fora do modo incremental retorna None.
+        """
+        if self.checkpoints is None:
+            return None
+        last_id = self.checkpoints.get(event_type)
+        if last_id is None:
+            cursor.execute(bootstrap_sql, (time_threshold,))
+            last_id = cursor.fetchone()["pos"]
+            self.checkpoints.avancar(event_type, last_id)
+        return last_id
+
+    def _resolve_contacts(self, cursor, rows):
+        """Preenche nomes e telefones das linhas a partir do diretório de usuários."""
+        ids = set()
+        for row in rows:
+            for coluna in CONTACT_COLUMNS:
+                ids.add(row.get(coluna))
+        contatos = self.directory.resolver(cursor, ids)
+        for row in rows:
+            for coluna, (nome, telefone) in CONTACT_COLUMNS.items():
+                contato = contatos.get(row.get(coluna))
+                row[nome] = contato.name if contato else None
+                if telefone:
+                    row[telefone] = contato.phone if contato else None
+        return rows
+
+    def _normalize_events(self, eventos):
+        """Remove o HTML dos textos dos eventos."""
+        if not eventos:
+            return eventos
+        with metricas.NORMALIZE_SECONDS.time(
+            tenant=self.tenant, event_type=eventos[0].event_type
+        ):
+            self._normalize_texts(eventos)
+        return eventos
+
+    def _normalize_texts(self, eventos):
+        for evento in eventos:
+            evento.content = self.normalize_html_text(
+                evento.content, self.max_text_length
+            )
+            if evento.comment is not None:
+                evento.comment = self.normalize_html_text(
+                    evento.comment, self.max_text_length
+                )
+
+    def confirm_checkpoints(self, event_type=None):
+        """Grava em disco as posições dos eventos já tratados."""
+        if self.checkpoints is not None:
+            self.checkpoints.confirmar(event_type)
+
+    def _time_threshold(self, interval_minutes):
+        """Início da janela de busca: ``interval_minutes`` minutos atrás.
+
+        Também aceita um ``datetime``, usado como início exato da janela.
+        """
+        if isinstance(interval_minutes, datetime):
+            return interval_minutes
+        tz = pytz.timezone("America/Sao_Paulo")
+        return datetime.now(tz) - timedelta(minutes=interval_minutes)
+
+    def _record_batch(self, event_type, eventos):
+        """Atualiza checkpoint e métricas com um lote de eventos gerado."""
+        self._advance_checkpoint(event_type, eventos)
+        metricas.EVENTS.inc(len(eventos), tenant=self.tenant, event_type=event_type)
+        datas = [evento.date for evento in eventos if evento.date is not None]
+        if datas:
+            newest = max(datas)
+            if newest > self.newest_event.get(event_type, datetime.min):
+                self.newest_event[event_type] = newest
+
+    def filter_notified(self, notificacoes, eventos):
+        """Remove as notificações ``(chave, mensagem, phone)`` já enviadas.
+
+        ``eventos`` mapeia cada chave ao seu evento; as chaves novas são
+        registradas até ``forget_notified`` passar da data do evento. Só
+        filtra os tipos buscados por janela de tempo.
+        """
+        novas = []
+        with self._notified_lock:
+            for item in notificacoes:
+                evento = eventos[item[0]]
+                chaves = self.notified_keys.get(evento.event_type)
+                if chaves is None:
+                    novas.append(item)
+                    continue
+                if item[0] in chaves:
+                    continue
+                chaves[item[0]] = evento.date
+                novas.append(item)
+        return novas
+
+    def forget_notified(self, event_type, time_threshold):
+        """Esquece as chaves de eventos anteriores ao início da janela."""
+        # As datas do GLPI são gravadas no horário local, sem fuso
+        limite = time_threshold.replace(tzinfo=None)
+        with self._notified_lock:
+            chaves = self.notified_keys.setdefault(event_type, {})
+            for chave in [
+                chave for chave, data in chaves.items() if data is None or data < limite
+            ]:
+                del chaves[chave]
+
+    def _record_failure(self, event_type):
+        self.query_failures[event_type] = self.query_failures.get(event_type, 0) + 1
+
+    def _update_lag(self, event_type):
+        """Atualiza o atraso entre agora e o evento mais recente do tipo."""
+        newest = self.newest_event.get(event_type)
+        if newest is None:
+            return
+        # As datas do GLPI são gravadas no horário local, sem fuso
+        agora = datetime.now(pytz.timezone("America/Sao_Paulo")).replace(tzinfo=None)
+        metricas.LAG_SECONDS.set(
+            round((agora - newest).total_seconds(), 3),
+            tenant=self.tenant,
+            event_type=event_type,
+        )
+
+    def _advance_checkpoint(self, event_type, eventos):
+        """Avança o checkpoint do tipo até o último evento do lote."""
+        if self.checkpoints is None or not eventos:
+            return
+        if event_type == "closures":
+            ultimo = max(eventos, key=lambda e: (e.date, e.ticket_id))
+            self.checkpoints.avancar(
+                "closures",
+                [ultimo.date.strftime("%Y-%m-%d %H:%M:%S"), ultimo.ticket_id],
+            )
+        else:
+            self.checkpoints.avancar(
+                event_type, max(evento.item_id for evento in eventos)
+            )
+
+    def _resolve_batch(self, event_type, aggregator, rows, cursor):
+        """Resolve os contatos de um lote de linhas e devolve os eventos completos."""
+        self._resolve_contacts(cursor, rows)
+        return self._normalize_events(aggregator.adicionar(rows))
+
+    def _read_page(self, conn, event_type, aggregator, sql, params):
+        """Executa uma consulta e devolve ``(linhas, eventos completos, segundos)``.
+
+        O cursor é fechado antes de devolver: quem consome os eventos pode
+        demorar (fila de notificações cheia) sem deixar uma leitura aberta
+        no servidor.
+        """
+        with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+            inicio = time.perf_counter()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            segundos = time.perf_counter() - inicio
+            eventos = self._resolve_batch(event_type, aggregator, rows, cursor)
+        return rows, eventos, segundos
+
+    def _iter_events(
+        self, event_type, build_query, interval_minutes, batch_size, raise_errors=False
+    ):
+        """Executa a consulta de um tipo de evento e gera os eventos em lotes.
+
+        Sem ``batch_size`` o resultado é lido de uma vez e gerado num único
+        lote. Com ``batch_size`` a consulta é lida em páginas de até
+        ``batch_size`` linhas, pela chave de ordenação (keyset), e cada
+        página é normalizada e agrupada antes de ser gerada, mantendo a
+        memória limitada. Nenhum cursor fica aberto enquanto um lote é
+        notificado, então um consumidor lento não prende um snapshot do
+        InnoDB nem estoura o ``net_write_timeout`` do servidor. O
+        checkpoint avança a cada lote gerado. Erros do banco são
+        registrados no log e, com ``raise_errors``, repassados a quem chamou.
+        """
         conn = self._get_db_connection()
         if not conn:
-            return []
+            self._record_failure(event_type)
+            return
+        # Tempo gasto no banco (execução + leitura), sem o processamento
+        query_seconds = 0.0
+        total_rows = 0
         try:
+            # A consulta é montada uma vez: a janela de tempo e a posição
+            # inicial não mudam entre as páginas
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                tz = pytz.timezone("America/Sao_Paulo")
-                time_threshold = datetime.now(tz) - timedelta(minutes=interval_minutes)
+                query = build_query(cursor, interval_minutes)
+            aggregator = EventAggregator(event_type)
+            if batch_size is None:
+                sql, params = query.render()
+                rows, eventos, query_seconds = self._read_page(
+                    conn, event_type, aggregator, sql, params
+                )
+                total_rows = len(rows)
+                eventos += self._normalize_events(aggregator.finalizar())
+                logging.debug(
+                    f"Consulta de {event_type} retornou {len(rows)} linhas em {len(eventos)} eventos"
+                )
+                self._record_batch(event_type, eventos)
+                yield eventos
+                return
+            after, inclusive = None, True
+            while True:
+                sql, params = query.render(after, batch_size, inclusive)
+                rows, eventos, segundos = self._read_page(
+                    conn, event_type, aggregator, sql, params
+                )
+                query_seconds += segundos
+                total_rows += len(rows)
+                if eventos:
+                    self._record_batch(event_type, eventos)
+                    yield eventos
+                if len(rows) < batch_size:
+                    break
+                after = ultimo = query.key(rows[-1])
+                # A página seguinte relê o último evento, que pode ter sido
+                # cortado. Se a página inteira era desse evento, o resto dele
+                # é lido de uma vez, sem LIMIT, e a paginação segue depois dele
+                inclusive = query.key(rows[0]) != ultimo
+                if not inclusive:
+                    sql, params = query.render_event(ultimo)
+                    rows, eventos, segundos = self._read_page(
+                        conn, event_type, aggregator, sql, params
+                    )
+                    query_seconds += segundos
+                    total_rows += len(rows)
+                    if eventos:
+                        self._record_batch(event_type, eventos)
+                        yield eventos
+            eventos = self._normalize_events(aggregator.finalizar())
+            if eventos:
+                self._record_batch(event_type, eventos)
+                yield eventos
+        except (pymysql.MySQLError, TimeoutError) as e:
+            logging.error(f"Erro ao buscar {event_type}: {e}")
+            self._record_failure(event_type)
+            if raise_errors:
+                raise
+        finally:
+            self._release_db_connection(conn)
+            metricas.QUERY_SECONDS.observe(
+                query_seconds, tenant=self.tenant, event_type=event_type
+            )
+            metricas.QUERY_ROWS.observe(
+                total_rows, tenant=self.tenant, event_type=event_type
+            )
+            self._update_lag(event_type)
+
+    def _new_tickets_query(self, cursor, interval_minutes, ids=None):
+        """Monta a consulta de novos tickets.
+
+        Com ``ids`` (modo captura) busca só esses eventos. No modo
+        incremental a leitura para antes do primeiro ticket criado há menos
+        de ``settle_seconds``: o GLPI grava o ticket antes dos solicitantes
+        (``glpi_tickets_users``), e um ticket lido no meio disso sairia sem
+        destinatários e ficaria para trás do checkpoint.
+        """
+        keys, descending = (("t.id", "id"),), False
+        if ids is not None:
+            where, params = _ids_filter("t.id", ids)
+        else:
+            time_threshold = self._time_threshold(interval_minutes)
+            last_id = self._checkpoint_position(
+                cursor,
+                "tickets",
+                "SELECT COALESCE(MAX(id), 0) AS pos FROM glpi_tickets WHERE date_creation < %s",
+                time_threshold,
+            )
+            if last_id is None:
                 logging.info(
                     f"Buscando tickets criados desde {time_threshold.strftime('%Y-%m-%d %H:%M:%S')}"
                 )
-                sql = """
-                    SELECT
-                        t.id,
-                        t.name,
-                        t.content,
-                        t.date_creation,
-                        t.date_mod,
-                        t.status,
-                        CONCAT(req_user.firstname, ' ', req_user.realname) AS requester_name,
-                        req_email.email AS requester_email,
-                        CONCAT(tech_user.firstname, ' ', tech_user.realname) AS technician_name,
-                        req_user.phone AS phone,
-                        tech_email.email AS technician_email
-                    FROM glpi_tickets AS t
-                    -- Join para encontrar o Solicitante do ticket (type=1)
-                    LEFT JOIN glpi_tickets_users AS req_tu
-                    ON t.id = req_tu.tickets_id
-                    AND req_tu.type = 1
-                    LEFT JOIN glpi_users AS req_user
-                    ON req_tu.users_id = req_user.id
-                    LEFT JOIN glpi_useremails AS req_email
-                    ON req_user.id = req_email.users_id
-                    AND req_email.is_default = 1
-                    -- Join para encontrar o Técnico Atribuído ao ticket (type=2)
-                    LEFT JOIN glpi_tickets_users AS tech_tu
-                    ON t.id = tech_tu.tickets_id AND tech_tu.type = 2
-                    LEFT JOIN glpi_users AS tech_user
-                    ON tech_tu.users_id = tech_user.id
-                    LEFT JOIN glpi_useremails AS tech_email
-                    ON tech_user.id = tech_email.users_id
-                    AND tech_email.is_default = 1
-                    WHERE t.date_creation >= %s
-                    ORDER BY t.date_creation DESC;
-                    """
-                cursor.execute(sql, (time_threshold,))
-                chamados = cursor.fetchall()
-                # Remove tags HTML do campo content
-                for chamado in chamados:
-                    chamado["content"] = self.normalize_html_text(chamado["content"])
-                return chamados
-        except pymysql.MySQLError as e:
-            logging.error(f"Erro ao buscar acompanhamentos: {e}")
-            return []
-        finally:
-            conn.close()
+                where, params = "t.date_creation >= %s", (time_threshold,)
+                keys = (("t.date_creation", "date_creation"), ("t.id", "id"))
+                descending = True
+            else:
+                logging.info(f"Buscando tickets com id maior que {last_id}")
+                recentes = self._time_threshold(self.settle_seconds / 60)
+                where = (
+                    "t.id > %s AND t.id < (SELECT COALESCE(MIN(n.id), 4294967296) "
+                    "FROM glpi_tickets AS n WHERE n.id > %s AND n.date_creation > %s)"
+                )
+                params = (last_id, last_id, recentes)
+        select = """
+            SELECT
+                t.id,
+                t.name,
+                t.content,
+                t.date_creation,
+                t.date_mod,
+                t.status,
+                req_tu.users_id AS requester_id,
+                tech_tu.users_id AS technician_id
+            FROM glpi_tickets AS t
+            -- Join para encontrar o Solicitante do ticket (type=1)
+            LEFT JOIN glpi_tickets_users AS req_tu
+            ON t.id = req_tu.tickets_id
+            AND req_tu.type = 1
+            -- Join para encontrar o Técnico Atribuído ao ticket (type=2)
+            LEFT JOIN glpi_tickets_users AS tech_tu
+            ON t.id = tech_tu.tickets_id AND tech_tu.type = 2"""
+        return EventQuery(select, where, params, keys, descending)
 
-    def get_close_tickets(self, interval_minutes=3):
-        """Busca por tickets fechados no intervalo de tempo."""
+    def _close_tickets_query(self, cursor, interval_minutes, ids=None):
+        """Monta a consulta de tickets fechados.
+
+        Com ``ids`` (modo captura) busca só esses eventos.
+        """
+        keys = (("t.date_mod", "date_mod"), ("t.id", "id"))
+        descending = False
+        if ids is not None:
+            where, params = _ids_filter("t.id", ids)
+            keys = (("t.id", "id"),)
+        else:
+            time_threshold = self._time_threshold(interval_minutes)
+            # Fechamentos não têm id próprio: o checkpoint é o par (date_mod, id)
+            position = None
+            if self.checkpoints is not None:
+                position = self.checkpoints.get("closures")
+                if position is None:
+                    position = [time_threshold.strftime("%Y-%m-%d %H:%M:%S"), 0]
+                    self.checkpoints.avancar("closures", position)
+            if position is None:
+                logging.info(
+                    f"Buscando tickets fechados desde {time_threshold.strftime('%Y-%m-%d %H:%M:%S')}"
+                )
+                where, params = "t.date_mod >= %s", (time_threshold,)
+                descending = True
+            else:
+                logging.info(
+                    f"Buscando tickets fechados após {position[0]} (id {position[1]})"
+                )
+                where = "(t.date_mod > %s OR (t.date_mod = %s AND t.id > %s))"
+                params = (position[0], position[0], position[1])
+        select = """
+            SELECT
+                t.id,
+                t.name,
+                s.id AS solution_id,
+                s.content,
+                t.date_creation,
+                t.date_mod,
+                t.status,
+                req_tu.users_id AS requester_id,
+                tech_tu.users_id AS technician_id
+            FROM glpi_tickets AS t
+            -- Join para pegar a descrição da solução
+            LEFT JOIN glpi_itilsolutions AS s
+            ON t.id = s.items_id
+            AND s.itemtype = 'Ticket'
+            -- Join para encontrar o Solicitante do ticket (type=1)
+            LEFT JOIN glpi_tickets_users AS req_tu
+            ON t.id = req_tu.tickets_id
+            AND req_tu.type = 1
+            -- Join para encontrar o Técnico Atribuído ao ticket (type=2)
+            LEFT JOIN glpi_tickets_users AS tech_tu
+            ON t.id = tech_tu.tickets_id AND tech_tu.type = 2"""
+        return EventQuery(select, f"{where} AND t.status = 6", params, keys, descending)
+
+    def _new_validations_query(self, cursor, interval_minutes, ids=None):
+        """Monta a consulta de aprovações pendentes.
+
+        Com ``ids`` (modo captura) busca só esses eventos.
+        """
+        keys, descending = (("v.id", "validation_id"),), False
+        if ids is not None:
+            where, params = _ids_filter("v.id", ids)
+        else:
+            time_threshold = self._time_threshold(interval_minutes)
+            last_id = self._checkpoint_position(
+                cursor,
+                "validations",
+                "SELECT COALESCE(MAX(id), 0) AS pos FROM glpi_ticketvalidations WHERE submission_date < %s",
+                time_threshold,
+            )
+            if last_id is None:
+                logging.info(
+                    f"Buscando aprovações de tickets desde {time_threshold.strftime('%Y-%m-%d %H:%M:%S')}"
+                )
+                where, params = "t.date_mod >= %s", (time_threshold,)
+                keys = (("t.date_mod", "date_mod"), ("v.id", "validation_id"))
+                descending = True
+            else:
+                logging.info(f"Buscando aprovações com id maior que {last_id}")
+                where, params = "v.id > %s", (last_id,)
+        select = """
+            SELECT
+                t.id,
+                v.id AS validation_id,
+                t.name,
+                t.content,
+                v.comment_submission,
+                t.date_creation,
+                t.date_mod,
+                t.status,
+                req_tu.users_id AS requester_id,
+                v.users_id AS validator_id
+            FROM glpi_tickets AS t
+            -- Join para pegar a validação
+            LEFT JOIN glpi_ticketvalidations AS v
+            ON t.id = v.tickets_id
+            -- Join para encontrar o Solicitante do ticket (type=1)
+            LEFT JOIN glpi_tickets_users AS req_tu
+            ON t.id = req_tu.tickets_id
+            AND req_tu.type = 1"""
+        return EventQuery(select, f"{where} AND v.status = 2", params, keys, descending)
+
+    def _new_followups_query(self, cursor, interval_minutes, ids=None):
+        """Monta a consulta de novos acompanhamentos.
+
+        Com ``ids`` (modo captura) busca só esses eventos.
+        """
+        keys, descending = (("f.id", "id"),), False
+        if ids is not None:
+            where, params = _ids_filter("f.id", ids)
+        else:
+            time_threshold = self._time_threshold(interval_minutes)
+            last_id = self._checkpoint_position(
+                cursor,
+                "followups",
+                "SELECT COALESCE(MAX(id), 0) AS pos FROM glpi_itilfollowups WHERE date_creation < %s",
+                time_threshold,
+            )
+            if last_id is None:
+                logging.info(
+                    f"Buscando acompanhamentos criados desde {time_threshold.strftime('%Y-%m-%d %H:%M:%S')}"
+                )
+                where, params = "f.date_creation >= %s", (time_threshold,)
+                keys = (("f.date_creation", "date_creation"), ("f.id", "id"))
+                descending = True
+            else:
+                logging.info(f"Buscando acompanhamentos com id maior que {last_id}")
+                where, params = "f.id > %s", (last_id,)
+        select = """
+            SELECT
+                f.id,
+                f.items_id AS ticket_id,
+                f.content,
+                f.date_creation,
+                t.name AS ticket_title,
+                f.users_id AS author_id,
+                req_tu.users_id AS requester_id,
+                tech_tu.users_id AS technician_id
+            FROM glpi_itilfollowups AS f
+            -- Join para pegar o título do ticket
+            INNER JOIN glpi_tickets AS t ON f.items_id = t.id
+            -- Join para encontrar o Solicitante do ticket (type=1)
+            LEFT JOIN glpi_tickets_users AS req_tu
+            ON t.id = req_tu.tickets_id
+            AND req_tu.type = 1
+            -- Join para encontrar o Técnico Atribuído ao ticket (type=2)
+            LEFT JOIN glpi_tickets_users AS tech_tu
+            ON t.id = tech_tu.tickets_id AND tech_tu.type = 2"""
+        return EventQuery(
+            select,
+            f"f.itemtype = 'Ticket' AND f.is_private = 0 AND {where}",
+            params,
+            keys,
+            descending,
+        )
+
+    def iter_new_tickets(self, interval_minutes=3, batch_size=500):
+        """Gera, em lotes, os novos tickets criados no intervalo de tempo."""
+        return self._iter_events(
+            "tickets", self._new_tickets_query, interval_minutes, batch_size
+        )
+
+    def iter_close_tickets(self, interval_minutes=3, batch_size=500):
+        """Gera, em lotes, os tickets fechados no intervalo de tempo."""
+        return self._iter_events(
+            "closures", self._close_tickets_query, interval_minutes, batch_size
+        )
+
+    def iter_new_validations(self, interval_minutes=3, batch_size=500):
+        """Gera, em lotes, as aprovações solicitadas no intervalo de tempo."""
+        return self._iter_events(
+            "validations", self._new_validations_query, interval_minutes, batch_size
+        )
+
+    def iter_new_followups(self, interval_minutes=3, batch_size=500):
+        """Gera, em lotes, os acompanhamentos criados no intervalo de tempo."""
+        return self._iter_events(
+            "followups", self._new_followups_query, interval_minutes, batch_size
+        )
+
+    def _capture_position(self, cursor):
+        """Última mudança capturada já consumida (pendente ou confirmada)."""
+        if self.checkpoints is not None:
+            position = self.checkpoints.get("captura")
+        else:
+            position = self.capture_position
+        if position is None:
+            position = captura.posicao_inicial(cursor, 3)
+            self.advance_capture(position)
+        return position
+
+    def advance_capture(self, position):
+        """Registra a posição consumida da tabela de captura."""
+        if self.checkpoints is not None:
+            self.checkpoints.avancar("captura", position)
+        else:
+            self.capture_position = position
+
+    def read_changes(self, limit=5000, settle_seconds=0):
+        """Lê as mudanças gravadas pelos triggers após a posição consumida.
+
+        Mudanças mais novas que ``settle_seconds`` ficam para a próxima
+        leitura (ver ``captura.ler_mudancas``). Retorna ``({event_type: [ids]}, last_id)``, ou ``({}, None)`` se a
+        leitura falhar.
+        """
         conn = self._get_db_connection()
         if not conn:
-            return []
+            return {}, None
         try:
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                tz = pytz.timezone("America/Sao_Paulo")
-                time_threshold = datetime.now(tz) - timedelta(minutes=interval_minutes)
-                logging.info(
-                    f"Buscando tickets fechados desde {time_threshold.strftime('%Y-%m-%d %H:%M:%S')}"
+                position = self._capture_position(cursor)
+                inicio = time.perf_counter()
+                mudancas, last_id = captura.ler_mudancas(
+                    cursor, position, limit, settle_seconds
+                )
+                metricas.QUERY_SECONDS.observe(
+                    time.perf_counter() - inicio,
+                    tenant=self.tenant,
+                    event_type="captura",
                 )
-                sql = """
-                    SELECT
-                        t.id,
-                        t.name,
-                        s.content,
-                        t.date_creation,
-                        t.date_mod,
-                        t.status,
-                        CONCAT(req_user.firstname, ' ', req_user.realname) AS requester_name,
-                        req_email.email AS requester_email,
-                        req_user.phone AS phone,
-                        CONCAT(tech_user.firstname, ' ', tech_user.realname) AS technician_name,
-                        tech_email.email AS technician_email
-                    FROM glpi_tickets AS t
-                    -- Join para pegar a descrição da solução
-                    LEFT JOIN glpi_itilsolutions AS s
-                    ON t.id = s.items_id
-                    -- Join para encontrar o Solicitante do ticket (type=1)
-                    LEFT JOIN glpi_tickets_users AS req_tu
-                    ON t.id = req_tu.tickets_id
-                    AND req_tu.type = 1
-                    LEFT JOIN glpi_users AS req_user
-                    ON req_tu.users_id = req_user.id
-                    LEFT JOIN glpi_useremails AS req_email
-                    ON req_user.id = req_email.users_id
-                    AND req_email.is_default = 1
-                    -- Join para encontrar o Técnico Atribuído ao ticket (type=2)
-                    LEFT JOIN glpi_tickets_users AS tech_tu
-                    ON t.id = tech_tu.tickets_id AND tech_tu.type = 2
-                    LEFT JOIN glpi_users AS tech_user
-                    ON tech_tu.users_id = tech_user.id
-                    LEFT JOIN glpi_useremails AS tech_email
-                    ON tech_user.id = tech_email.users_id
-                    AND tech_email.is_default = 1
-                    WHERE t.date_mod >= %s
-                    AND t.status = 6
-                    ORDER BY t.date_mod DESC;
-                    """
-                cursor.execute(sql, (time_threshold,))
-                chamados = cursor.fetchall()
-                # Remove tags HTML do campo content
-                for chamado in chamados:
-                    chamado["content"] = self.normalize_html_text(chamado["content"])
-                return chamados
+            return mudancas, last_id
         except pymysql.MySQLError as e:
-            logging.error(f"Erro ao buscar acompanhamentos: {e}")
-            return []
+            logging.error(f"Erro ao ler mudanças capturadas: {e}")
+            return {}, None
         finally:
-            conn.close()
+            self._release_db_connection(conn)
 
-    def get_new_validations(self, interval_minutes=3):
-        """Busca por novos tickets criados no intervalo de tempo."""
+    def query_builder(self, event_type):
+        """Retorna o método que monta a consulta do tipo de evento."""
+        return {
+            "tickets": self._new_tickets_query,
+            "closures": self._close_tickets_query,
+            "validations": self._new_validations_query,
+            "followups": self._new_followups_query,
+        }[event_type]
+
+    def iter_changed_events(self, event_type, ids, batch_size=None, chunk_size=1000):
+        """Gera os eventos de ``ids`` capturados, com os joins só para eles.
+
+        Erros do banco são repassados, para que a posição de captura não
+        avance sobre eventos que não foram lidos.
+        """
+        build_query = self.query_builder(event_type)
+        for i in range(0, len(ids), chunk_size):
+            chunk = ids[i : i + chunk_size]
+            yield from self._iter_events(
+                event_type,
+                lambda cursor, _, chunk=chunk: build_query(cursor, None, ids=chunk),
+                None,
+                batch_size,
+                raise_errors=True,
+            )
+
+    def purge_changes(self, batch=1000):
+        """Apaga da tabela de captura as mudanças já consumidas e confirmadas."""
+        if self.checkpoints is not None:
+            position = self.checkpoints.get("captura")
+        else:
+            position = self.capture_position
+        if not position:
+            return 0
         conn = self._get_db_connection()
         if not conn:
-            return []
+            return 0
         try:
-            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                tz = pytz.timezone("America/Sao_Paulo")
-                time_threshold = datetime.now(tz) - timedelta(minutes=interval_minutes)
-                logging.info(
-                    f"Buscando aprovações de tickets desde {time_threshold.strftime('%Y-%m-%d %H:%M:%S')}"
-                )
-                sql = """
-                    SELECT
-                        t.id,
-                        t.name,
-                        t.content,
-                        v.comment_submission,
-                        t.date_creation,
-                        t.date_mod,
-                        t.status,
-                        CONCAT(req_user.firstname, ' ', req_user.realname) AS requester_name,
-                        req_user.phone AS phone,
-                        CONCAT(val_user.firstname, ' ', val_user.realname) AS validator_name,
-                        val_user.phone AS validator_phone
-                    FROM glpi_tickets AS t
-                    -- Join para pegar a validação
-                    LEFT JOIN glpi_ticketvalidations AS v
-                    ON t.id = v.tickets_id
-                    -- Join para encontrar o Solicitante do ticket (type=1)
-                    LEFT JOIN glpi_tickets_users AS req_tu
-                    ON t.id = req_tu.tickets_id
-                    AND req_tu.type = 1
-                    -- Join para encontrar o usuario Atribuído ao ticket
-                    LEFT JOIN glpi_users AS req_user
-                    ON req_tu.users_id = req_user.id
-                    -- Join para encontrar o Técnico Atribuído ao a validação
-                    LEFT JOIN glpi_users AS val_user
-                    ON v.users_id = val_user.id
-                    WHERE t.date_mod >= %s
-                    and v.status = 2
-                    ORDER BY t.date_mod DESC;
-                    """
-                cursor.execute(sql, (time_threshold,))
-                chamados = cursor.fetchall()
-                # Remove tags HTML do campo content
-                for chamado in chamados:
-                    chamado["content"] = self.normalize_html_text(chamado["content"])
-                    chamado["comment_submission"] = self.normalize_html_text(
-                        chamado["comment_submission"]
-                    )
-                return chamados
+            with conn.cursor() as cursor:
+                return captura.purgar(cursor, position, batch)
         except pymysql.MySQLError as e:
-            logging.error(f"Erro ao buscar acompanhamentos: {e}")
-            return []
+            logging.error(f"Erro ao apagar mudanças consumidas: {e}")
+            return 0
         finally:
-            conn.close()
+            self._release_db_connection(conn)
+
+    def get_new_tickets(self, interval_minutes=3):
+        """Busca por novos tickets criados no intervalo de tempo."""
+        return [
+            evento
+            for lote in self.iter_new_tickets(interval_minutes, batch_size=None)
+            for evento in lote
+        ]
+
+    def get_close_tickets(self, interval_minutes=3):
+        """Busca por tickets fechados no intervalo de tempo."""
+        return [
+            evento
+            for lote in self.iter_close_tickets(interval_minutes, batch_size=None)
+            for evento in lote
+        ]
+
+    def get_new_validations(self, interval_minutes=3):
+        """Busca por aprovações solicitadas no intervalo de tempo."""
+        return [
+            evento
+            for lote in self.iter_new_validations(interval_minutes, batch_size=None)
+            for evento in lote
+        ]
 
     def get_new_followups(self, interval_minutes=3):
         """Busca por novos acompanhamentos criados no intervalo de tempo."""
-        conn = self._get_db_connection()
-        if not conn:
-            return []
+        return [
+            evento
+            for lote in self.iter_new_followups(interval_minutes, batch_size=None)
+            for evento in lote
+        ]
 
-        try:
-            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                tz = pytz.timezone("America/Sao_Paulo")
-                time_threshold = datetime.now(tz) - timedelta(minutes=interval_minutes)
-                logging.info(
-                    f"Buscando acompanhamentos criados desde {time_threshold.strftime('%Y-%m-%d %H:%M:%S')}"
-                )
-                sql = """
-                    SELECT
-                        f.id,
-                        f.items_id AS ticket_id,
-                        f.content,
-                        f.date_creation,
-                        t.name AS ticket_title,
-                        author_email.email AS author_email,
-                        CONCAT(author.firstname, ' ', author.realname) AS author_name,
-                        req_user.phone AS phone,
-                        req_email.email AS requester_email,
-                        CONCAT(tech_user.firstname, ' ', tech_user.realname) AS technician_name,
-                        tech_email.email AS technician_email
-                    FROM glpi_itilfollowups AS f
-                    -- Join para pegar o título do ticket
-                    INNER JOIN glpi_tickets AS t ON f.items_id = t.id
-                    -- Join para pegar o autor do acompanhamento
-                    LEFT JOIN glpi_users AS author ON f.users_id = author.id
-                    LEFT JOIN glpi_useremails AS author_email
-                    ON author.id = author_email.users_id
-                    AND author_email.is_default = 1
-                    -- Join para encontrar o Solicitante do ticket (type=1)
-                    LEFT JOIN glpi_tickets_users AS req_tu
-                    ON t.id = req_tu.tickets_id
-                    AND req_tu.type = 1
-                    LEFT JOIN glpi_users AS req_user
-                    ON req_tu.users_id = req_user.id
-                    LEFT JOIN glpi_useremails AS req_email
-                    ON req_user.id = req_email.users_id
-                    AND req_email.is_default = 1
-                    -- Join para encontrar o Técnico Atribuído ao ticket (type=2)
-                    LEFT JOIN glpi_tickets_users AS tech_tu
-                    ON t.id = tech_tu.tickets_id AND tech_tu.type = 2
-                    LEFT JOIN glpi_users AS tech_user
-                    ON tech_tu.users_id = tech_user.id
-                    LEFT JOIN glpi_useremails AS tech_email
-                    ON tech_user.id = tech_email.users_id
-                    AND tech_email.is_default = 1
-                    WHERE f.itemtype = 'Ticket'
-                    AND f.is_private = 0
-                    AND f.date_creation >= %s
-                    ORDER BY f.date_creation DESC;
-                    """
-                cursor.execute(sql, (time_threshold,))
-                followups = cursor.fetchall()
-                # Remove tags HTML do campo content
-                for followup in followups:
-                    followup["content"] = self.normalize_html_text(followup["content"])
-                logging.info(
-                    f"Query de acompanhamentos retornou {len(followups)} resultados"
+
+def enfileirar_notificacoes(dispatcher, outbox, notificacoes, tenant=None):
+    """Envia as notificações ``(chave, mensagem, phone)`` ao dispatcher.
+
+    Com outbox, as notificações são gravadas antes do envio e as chaves já
+    registradas são ignoradas.
+    """
+    if outbox is None:
+        for _, mensagem, phone in notificacoes:
+            dispatcher.submit(mensagem, phone, tenant=tenant)
+        return
+    for outbox_id, mensagem, phone in outbox.adicionar_lote(notificacoes):
+        dispatcher.submit(mensagem, phone, outbox_id=outbox_id, tenant=tenant)
+
+
+def montar_mensagem(evento, glpi_url=None):
+    """Monta o texto da notificação de um evento."""
+    link = (
+        f"Clique para ver o chamado⬇️: \n"
+        f"{glpi_url or os.getenv('GLPI_URL')}/front/ticket.form.php?id={evento.ticket_id}\n"
+    )
+    if evento.event_type == "followups":
+        return (
+            f"💬 Novo acompanhamento\n"
+            f"{evento.author_name} adicionou um acompanhamento no chamado #{evento.ticket_id}.\n"
+            f"Título do chamado: {evento.title}\n"
+            f"Mensagem Adicionada: {evento.content}\n"
+            f"Registrado em: {evento.date}\n" + link
+        )
+    if evento.event_type == "tickets":
+        return (
+            f"🎫 Novo chamado GLPI\n"
+            f"ID: {evento.ticket_id}\n"
+            f"Título: {evento.title}\n"
+            f"Solicitante: {evento.requesters}\n"
+            f"Descrição: {evento.content}\n"
+            f"Registrado em: {evento.date}\n" + link
+        )
+    if evento.event_type == "closures":
+        return (
+            f"✅ Chamado Fechado!\n"
+            f"ID: {evento.ticket_id}\n"
+            f"Título: {evento.title}\n"
+            f"Solicitante: {evento.requesters}\n"
+            f"Data de fechamento: {evento.date}\n"
+            f"Solução: {evento.content}\n" + link
+        )
+    return (
+        f"☑️ Nova Aprovação Solicitada!\n"
+        f"ID: {evento.ticket_id}\n"
+        f"Título: {evento.title}\n"
+        f"Solicitante: {evento.requesters}\n"
+        f"Comentário da Solicitação: {evento.comment}\n"
+        f"Registrado em: {evento.date}\n" + link
+    )
+
+
+def notificar_eventos(dispatcher, outbox, eventos, monitor=None):
+    """Gera uma notificação por destinatário distinto de cada evento.
+
+    Com ``monitor``, o link usa a URL da instância do GLPI e as chaves de
+    idempotência levam o nome dela, para não colidirem entre instâncias. No
+    modo HA só seguem as notificações que esta réplica reivindicou como
+    líder do tipo (ver ``DatabaseSendLog``).
+    """
+    tenant = monitor.tenant if monitor is not None else ""
+    glpi_url = monitor.glpi_url if monitor is not None else None
+    notificacoes = []
+    por_chave = {}
+    for evento in eventos:
+        mensagem = montar_mensagem(evento, glpi_url)
+        for phone in evento.recipients:
+            chave = evento.idempotency_key(phone)
+            if tenant:
+                chave = f"{tenant}:{chave}"
+            notificacoes.append((chave, mensagem, phone))
+            por_chave[chave] = evento
+    if outbox is None and monitor is not None and monitor.checkpoints is None:
+        # Sem outbox, a sobreposição das janelas de tempo é filtrada em memória
+        notificacoes = monitor.filter_notified(notificacoes, por_chave)
+    if monitor is not None and monitor.envios is not None and notificacoes:
+        reivindicadas = monitor.envios.reivindicar(
+            {chave: evento.event_type for chave, evento in por_chave.items()}
+        )
+        notificacoes = [item for item in notificacoes if item[0] in reivindicadas]
+    enfileirar_notificacoes(dispatcher, outbox, notificacoes, tenant or None)
+
+
+# Tipo de evento -> (método de busca, mensagem com resultados, mensagem sem
+# resultados, linha de log de cada evento)
+EVENT_TYPES = {
+    "followups": (
+        "get_new_followups",
+        "Encontrados {} novos acompanhamentos.",
+        "Nenhum novo acompanhamento encontrado.",
+        lambda e: f"Acompanhamento ID: {e.item_id}, Ticket: {e.title}, Autor: {e.author_name}, Data: {e.date}",
+    ),
+    "tickets": (
+        "get_new_tickets",
+        "Encontrados {} novos tickets.",
+        "Nenhum novo ticket encontrado.",
+        lambda e: f"Ticket ID: {e.ticket_id}, Título: {e.title}, Solicitante: {e.requesters}, Data: {e.date}",
+    ),
+    "closures": (
+        "get_close_tickets",
+        "Encontrados {} tickets fechados.",
+        "Nenhum ticket fechado encontrado.",
+        lambda e: f"Ticket ID: {e.ticket_id}, Título: {e.title}, Solicitante: {e.requesters}, Data de fechamento: {e.date}",
+    ),
+    "validations": (
+        "get_new_validations",
+        "Encontradas {} novas aprovações.",
+        "Nenhuma nova aprovação encontrada.",
+        lambda e: f"Ticket ID: {e.ticket_id}, Título: {e.title}, Solicitante: {e.requesters}, Validador: {e.author_name}, Data: {e.date}",
+    ),
+}
+
+
+def registrar_eventos(event_type, eventos):
+    """Registra no log os eventos encontrados de um tipo."""
+    _, encontrados, nenhum, detalhe = EVENT_TYPES[event_type]
+    if eventos:
+        logging.info(encontrados.format(len(eventos)))
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            for evento in eventos[::LOG_AMOSTRA]:
+                logging.debug(detalhe(evento))
+    else:
+        logging.info(nenhum)
+
+
+def coletar_eventos(monitor, event_type, interval_minutes=3):
+    """Busca e registra no log os eventos de um tipo."""
+    eventos = getattr(monitor, EVENT_TYPES[event_type][0])(interval_minutes)
+    registrar_eventos(event_type, eventos)
+    return eventos
+
+
+def processar_em_lotes(
+    monitor, dispatcher, outbox, event_type, interval_minutes, batch_size
+):
+    """Busca os eventos de um tipo em páginas e notifica cada lote.
+
+    O checkpoint é confirmado após cada lote, então um catch-up longo
+    começa a notificar no primeiro lote e pode ser interrompido sem perder
+    o que já foi enfileirado. Retorna o número de eventos processados.
+    """
+    iterador = getattr(monitor, EVENT_TYPES[event_type][0].replace("get_", "iter_", 1))
+    total = 0
+    for lote in iterador(interval_minutes, batch_size):
+        registrar_eventos(event_type, lote)
+        notificar_eventos(dispatcher, outbox, lote, monitor)
+        monitor.confirm_checkpoints(event_type)
+        total += len(lote)
+    if not total:
+        registrar_eventos(event_type, [])
+    return total
+
+
+def processar_captura(
+    monitor,
+    dispatcher,
+    outbox,
+    limit,
+    batch_size=None,
+    purge_batch=1000,
+    settle_seconds=10,
+):
+    """Consome a tabela de captura e notifica os eventos alterados.
+
+    Só os ids gravados pelos triggers passam pelas consultas com joins. A
+    posição de captura avança e é confirmada depois que todos os eventos
+    lidos foram entregues ao dispatcher/outbox; as linhas consumidas são
+    então apagadas. Mudanças capturadas há menos de ``settle_seconds``
+    esperam a próxima execução, para o GLPI terminar de gravar as linhas
+    relacionadas (os solicitantes de um ticket novo, por exemplo). Retorna
+    o número de eventos, ou None em caso de erro.
+    """
+    mudancas, last_id = monitor.read_changes(limit, settle_seconds)
+    if last_id is None:
+        return None
+    if not mudancas:
+        return 0
+    total = 0
+    try:
+        for event_type in EVENT_TYPES:
+            ids = mudancas.get(event_type)
+            if not ids:
+                continue
+            for lote in monitor.iter_changed_events(event_type, ids, batch_size):
+                registrar_eventos(event_type, lote)
+                notificar_eventos(dispatcher, outbox, lote, monitor)
+                total += len(lote)
+    except (pymysql.MySQLError, TimeoutError):
+        # Já registrado no log; a próxima execução relê as mesmas mudanças
+        return None
+    monitor.advance_capture(last_id)
+    monitor.confirm_checkpoints()
+    if purge_batch:
+        monitor.purge_changes(purge_batch)
+    return total
+
+
+def entregar_resultados(monitor, dispatcher, outbox, resultados):
+    """Notifica os eventos coletados em paralelo, em ordem cronológica.
+
+    ``resultados`` são pares ``(tarefa, eventos)`` do agendador. Os
+    checkpoints de cada tipo só são confirmados depois que seus eventos
+    foram entregues ao dispatcher/outbox.
+    """
+    coletados = [
+        (job, eventos) for job, eventos in resultados if isinstance(eventos, list)
+    ]
+    eventos = sorted(
+        (evento for _, lista in coletados for evento in lista),
+        key=lambda evento: evento.date or datetime.min,
+    )
+    notificar_eventos(dispatcher, outbox, eventos, monitor)
+    for job, _ in coletados:
+        monitor.confirm_checkpoints(job.name)
+
+
+def criar_tarefa(
+    monitor, event_type, dispatcher=None, outbox=None, batch_size=None, folga_minutos=2
+):
+    """Cria a tarefa do agendador para um tipo de evento.
+
+    Fora do modo incremental a primeira busca olha 3 minutos para trás e
+    cada busca seguinte começa ``folga_minutos`` antes do início da
+    anterior. O GLPI grava as datas com a hora em que a requisição (ou o
+    cron, ou o coletor de e-mails) começou, não a do commit, então uma
+    linha pode aparecer com data anterior a uma busca que já rodou; a
+    folga a relê. Os eventos repetidos pela sobreposição são descartados
+    pelo outbox ou, sem ele, pelas chaves em memória do monitor
+    (``filter_notified``). Se a busca falhar, a janela seguinte repete o
+    mesmo início. Com ``batch_size`` a tarefa lê e notifica em lotes (ver
+    ``processar_em_lotes``); sem ele, devolve os eventos ao agendador.
+    """
+    tz = pytz.timezone("America/Sao_Paulo")
+    desde = None
+
+    def tarefa():
+        nonlocal desde
+        # As datas do GLPI têm precisão de segundos
+        inicio = datetime.now(tz).replace(microsecond=0)
+        if desde is None:
+            janela = inicio - timedelta(minutes=3)
+        else:
+            janela = desde - timedelta(minutes=folga_minutos)
+        monitor.forget_notified(event_type, janela)
+        falhas = monitor.query_failures.get(event_type, 0)
+        with metricas.CYCLE_SECONDS.time(tenant=monitor.tenant, event_type=event_type):
+            if batch_size:
+                resultado = processar_em_lotes(
+                    monitor, dispatcher, outbox, event_type, janela, batch_size
                 )
-                for i, followup in enumerate(followups):
-                    logging.info(
-                        f"Acompanhamento {i+1}: ID={followup['id']}, ticket_id={followup['ticket_id']}, author_email={followup['author_email']}, requester_email={followup['requester_email']}, technician_email={followup['technician_email']}"
-                    )
-                return followups
-        except pymysql.MySQLError as e:
-            logging.error(f"Erro ao buscar acompanhamentos: {e}")
-            return []
-        finally:
-            conn.close()
+            else:
+                resultado = coletar_eventos(monitor, event_type, janela)
+        if monitor.query_failures.get(event_type, 0) == falhas:
+            desde = inicio
+        return resultado
 
+    return tarefa
 
-def __main__():
-    """Função principal para executar o monitoramento."""
+
+def carregar_config():
+    """Lê do ambiente (e do .env) a configuração do banco e do monitor."""
     load_dotenv()
-    config = {
+    return {
+        "GLPI_URL": os.getenv("GLPI_URL"),
         "DB_HOST": os.getenv("DB_HOST"),
+        "DB_PORT": os.getenv("DB_PORT"),
         "DB_USER": os.getenv("DB_USER"),
         "DB_PASSWORD": os.getenv("DB_PASSWORD"),
         "DB_NAME": os.getenv("DB_NAME"),
+        "DB_POOL_SIZE": os.getenv("DB_POOL_SIZE"),
+        "DB_POOL_MAX_IDLE": os.getenv("DB_POOL_MAX_IDLE"),
+        "DB_READ_TIMEOUT": os.getenv("DB_READ_TIMEOUT"),
+        "TEXTO_MAX": os.getenv("NOTIFICACAO_TEXTO_MAX"),
+        "COLETA_ESPERA": os.getenv("COLETA_ESPERA"),
+        "DIRETORIO_MAX": os.getenv("DIRETORIO_MAX"),
+        "DIRETORIO_TTL": os.getenv("DIRETORIO_TTL"),
     }
+
+
+def configurar_captura(remover=False):
+    """Instala (ou remove) os triggers do modo captura no banco do GLPI."""
+    config = carregar_config()
     monitor = GLPIMonitor(config)
-    while True:
-        logging.info(f"Conectando ao banco de dados GLPI: {config['DB_HOST']}")
-        followups = monitor.get_new_followups()
-        if followups:
-            logging.info(f"Encontrados {len(followups)} novos acompanhamentos.")
-            for followup in followups:
-                logging.info(
-                    f"Acompanhamento ID: {followup['id']}, Ticket: {followup['ticket_title']}, Autor: {followup['author_name']}, Data: {followup['date_creation']}"
-                )
-                if followup["phone"]:
-                    from services.chamada_notificacao import enviar_notificacao
-
-                    mensagem = (
-                        f"💬 Novo acompanhamento\n"
-                        f"{followup['author_name']} adicionou um acompanhamento no chamado #{followup['ticket_id']}.\n"
-                        f"Título do chamado: {followup['ticket_title']}\n"
-                        f"Mensagem Adicionada: {followup['content']}\n"
-                        f"Registrado em: {followup['date_creation']}\n"
-                        f"Clique para ver o chamado⬇️: \n{os.getenv('GLPI_URL')}/front/ticket.form.php?id={followup['ticket_id']}\n"
-                    )
-                    enviar_notificacao(mensagem, followup["phone"])
-        else:
-            logging.info("Nenhum novo acompanhamento encontrado.")
-        tickets = monitor.get_new_tickets()
-        if tickets:
-            logging.info(f"Encontrados {len(tickets)} novos tickets.")
-            for ticket in tickets:
-                logging.info(
-                    f"Ticket ID: {ticket['id']}, Título: {ticket['name']}, Solicitante: {ticket['requester_name']}, Data: {ticket['date_creation']}"
-                )
-                if ticket["phone"]:
-                    from services.chamada_notificacao import enviar_notificacao
-
-                    mensagem = (
-                        f"🎫 Novo chamado GLPI\n"
-                        f"ID: {ticket['id']}\n"
-                        f"Título: {ticket['name']}\n"
-                        f"Solicitante: {ticket['requester_name']}\n"
-                        f"Descrição: {ticket['content']}\n"
-                        f"Registrado em: {ticket['date_creation']}\n"
-                        f"Clique para ver o chamado⬇️: \n{os.getenv('GLPI_URL')}/front/ticket.form.php?id={ticket['id']}\n"
-                    )
-                    enviar_notificacao(mensagem, ticket["phone"])
-        else:
-            logging.info("Nenhum novo ticket encontrado.")
-        closed_tickets = monitor.get_close_tickets()
-        if closed_tickets:
-            logging.info(f"Encontrados {len(closed_tickets)} tickets fechados.")
-            for ticket in closed_tickets:
-                logging.info(
-                    f"Ticket ID: {ticket['id']}, Título: {ticket['name']}, Solicitante: {ticket['requester_name']}, Data de fechamento: {ticket['date_mod']}"
-                )
-                if ticket["phone"]:
-                    from services.chamada_notificacao import enviar_notificacao
-
-                    mensagem = (
-                        f"✅ Chamado Fechado!\n"
-                        f"ID: {ticket['id']}\n"
-                        f"Título: {ticket['name']}\n"
-                        f"Solicitante: {ticket['requester_name']}\n"
-                        f"Data de fechamento: {ticket['date_mod']}\n"
-                        f"Solução: {ticket['content']}\n"
-                        f"Clique para ver o chamado⬇️: \n{os.getenv('GLPI_URL')}/front/ticket.form.php?id={ticket['id']}\n"
-                    )
-                    enviar_notificacao(mensagem, ticket["phone"])
-        else:
-            logging.info("Nenhum ticket fechado encontrado.")
-        validations = monitor.get_new_validations()
-        if validations:
-            logging.info(f"Encontradas {len(validations)} novas aprovações.")
-            for validation in validations:
-                logging.info(
-                    f"Ticket ID: {validation['id']}, Título: {validation['name']}, Solicitante: {validation['requester_name']}, Validador: {validation['validator_name']}, Data: {validation['date_mod']}"
-                )
-                if validation["validator_phone"]:
-                    from services.chamada_notificacao import enviar_notificacao
-
-                    mensagem = (
-                        f"☑️ Nova Aprovação Solicitada!\n"
-                        f"ID: {validation['id']}\n"
-                        f"Título: {validation['name']}\n"
-                        f"Solicitante: {validation['requester_name']}\n"
-                        f"Comentário da Solicitação: {validation['comment_submission']}\n"
-                        f"Registrado em: {validation['date_mod']}\n"
-                        f"Clique para ver o chamado⬇️: \n{os.getenv('GLPI_URL')}/front/ticket.form.php?id={validation['id']}\n"
-                    )
-                    enviar_notificacao(mensagem, validation["validator_phone"])
-        else:
-            logging.info("Nenhuma nova aprovação encontrada.")
-        time.sleep(180)
+    with monitor.pool.connection() as conn:
+        with conn.cursor() as cursor:
+            if remover:
+                captura.remover(cursor)
+            else:
+                captura.instalar(cursor)
+    monitor.pool.close()
+
+
+def perfilar_consultas(
+    janela, detalhado=False, com_analise=False, aplicar=False, amostragem=0
+):
+    """Perfila as consultas do monitor no banco configurado.
+
+    Com ``amostragem`` (segundos) fica reexecutando as consultas e
+    registrando as lentas em vez de imprimir o relatório.
+    """
+    from services import perfil_consultas
+
+    # Os "Buscando ..." das consultas atrapalhariam o relatório
+    logging.getLogger().setLevel(logging.WARNING)
+    config = carregar_config()
+    monitor = GLPIMonitor(config)
+    try:
+        if amostragem:
+            print(f"Amostrando as consultas a cada {amostragem:g}s (Ctrl+C para sair)")
+            perfil_consultas.amostrar(
+                monitor,
+                amostragem,
+                janela,
+                limite_segundos=float(os.getenv("CONSULTA_LENTA_SEGUNDOS") or 10),
+            )
+            return
+        relatorio = perfil_consultas.perfilar(monitor, janela, com_analise)
+        sugestoes = perfil_consultas.imprimir(relatorio, detalhado or com_analise)
+        if aplicar and sugestoes:
+            perfil_consultas.aplicar_indices(monitor, sugestoes)
+    finally:
+        monitor.pool.close()
+
+
+def carregar_instancias(path):
+    """Lê o arquivo JSON com as instâncias do GLPI a monitorar.
+
+    O arquivo é uma lista (ou ``{"instancias": [...]}``) de objetos com as
+    mesmas chaves das variáveis de ambiente (``DB_HOST``, ``GLPI_URL``,
+    ``INTERVALO_TICKETS``...) mais um ``NOME`` único. O que não for
+    informado vem do ambiente. Sem ``CHECKPOINT_FILE`` próprio, cada
+    instância usa o ``CHECKPOINT_FILE`` global com o nome como sufixo.
+    """
+    with open(path, encoding="utf-8") as arquivo:
+        dados = json.load(arquivo)
+    instancias = dados["instancias"] if isinstance(dados, dict) else dados
+    base = carregar_config()
+    configs = []
+    for instancia in instancias:
+        nome = instancia.get("NOME")
+        if not nome:
+            raise ValueError(f"Instância sem NOME em {path}")
+        if any(config["NOME"] == nome for config in configs):
+            raise ValueError(f"Instância {nome} repetida em {path}")
+        config = {**base, **instancia}
+        if "CHECKPOINT_FILE" not in instancia and os.getenv("CHECKPOINT_FILE"):
+            raiz, extensao = os.path.splitext(os.getenv("CHECKPOINT_FILE"))
+            config["CHECKPOINT_FILE"] = f"{raiz}-{nome}{extensao}"
+        configs.append(config)
+    return configs
+
+
+def _opcao(config, chave, padrao=None):
+    """Valor da configuração da instância, ou da variável de ambiente."""
+    valor = config.get(chave)
+    if valor is None or valor == "":
+        valor = os.getenv(chave)
+    return padrao if valor is None or valor == "" else valor
+
+
+def criar_instancia(config, notificador, outbox):
+    """Cria o monitor e o agendador de uma instância do GLPI.
+
+    Cada instância tem pool de conexões, checkpoints, intervalos e threads
+    de coleta próprios, então o acúmulo de uma não atrasa as buscas das
+    outras. As notificações de todas vão para o mesmo ``notificador``.
+    """
+    checkpoints = None
+    if _opcao(config, "CHECKPOINT_FILE"):
+        from services.checkpoint import CheckpointStore
+
+        checkpoints = CheckpointStore(_opcao(config, "CHECKPOINT_FILE"))
+        logging.info(f"Modo incremental ativo, checkpoints em {checkpoints.path}")
+    coleta_workers = int(_opcao(config, "COLETA_WORKERS", 4))
+    batch_size = int(_opcao(config, "COLETA_LOTE", 0)) or None
+    folga_minutos = float(_opcao(config, "JANELA_FOLGA", 2))
+    monitor = GLPIMonitor(config, checkpoints=checkpoints)
+    scheduler = Scheduler(
+        max_workers=coleta_workers,
+        on_results=lambda resultados: entregar_resultados(
+            monitor, notificador, outbox, resultados
+        ),
+    )
+    intervalo_min = float(_opcao(config, "INTERVALO_MIN", 15))
+    intervalo_max = float(_opcao(config, "INTERVALO_MAX", 600))
+    slow_seconds = float(_opcao(config, "CONSULTA_LENTA_SEGUNDOS", 10))
+    if _opcao(config, "CAPTURA"):
+        # Modo captura: uma leitura pela chave da tabela alimentada pelos
+        # triggers substitui as quatro buscas por data
+        logging.info("Modo captura ativo, lendo db_monitor_events")
+        limite = int(_opcao(config, "CAPTURA_LIMITE", 5000))
+        purga_lote = int(_opcao(config, "CAPTURA_PURGA_LOTE", 1000))
+        espera = float(_opcao(config, "CAPTURA_ESPERA", 10))
+        scheduler.add_job(
+            "captura",
+            lambda: processar_captura(
+                monitor, notificador, outbox, limite, batch_size, purga_lote, espera
+            ),
+            interval=float(_opcao(config, "CAPTURA_INTERVALO", 5)),
+            min_interval=float(_opcao(config, "CAPTURA_INTERVALO_MIN", 1)),
+            max_interval=float(_opcao(config, "CAPTURA_INTERVALO_MAX", 30)),
+            slow_seconds=slow_seconds,
+        )
+    else:
+        for event_type in EVENT_TYPES:
+            scheduler.add_job(
+                event_type,
+                criar_tarefa(
+                    monitor, event_type, notificador, outbox, batch_size, folga_minutos
+                ),
+                interval=float(_opcao(config, f"INTERVALO_{event_type.upper()}", 180)),
+                min_interval=intervalo_min,
+                max_interval=intervalo_max,
+                jitter=float(_opcao(config, "INTERVALO_JITTER", 0.1)),
+                slow_seconds=slow_seconds,
+                timeout=float(_opcao(config, "COLETA_TIMEOUT", 60)),
+            )
+    if _opcao(config, "HA"):
+        ativar_ha(monitor, scheduler, config)
+    return monitor, scheduler
+
+
+def ativar_ha(monitor, scheduler, config):
+    """Divide as tarefas da instância entre réplicas do monitor.
+
+    Cada tarefa (tipo de evento, ou a captura) só roda na réplica que
+    segura o seu lock no MySQL; nas demais ela retorna 0 sem consultar o
+    banco. Os checkpoints passam para a tabela ``db_monitor_checkpoints``,
+    de onde o novo líder continua quando uma réplica cai, e cada lote de
+    notificações é reivindicado em ``db_monitor_envios`` antes do envio,
+    para o novo líder não reenviar o que a réplica anterior já enviou. Ao
+    assumir um tipo, a tarefa é antecipada para não esperar o intervalo
+    crescido enquanto estava ociosa.
+    """
+    from services.checkpoint import DatabaseCheckpointStore, DatabaseSendLog
+    from services.lideranca import LeaderElection
+
+    intervalo = float(_opcao(config, "HA_INTERVALO", 5))
+    travamento = float(_opcao(config, "HA_TRAVAMENTO", 300))
+    eleicao = LeaderElection(
+        {**monitor.db_config, "read_timeout": max(30, int(intervalo * 6))},
+        f"dbm:{monitor.db_config['database']}:{monitor.tenant}",
+        [job.name for job in scheduler.jobs],
+        intervalo=intervalo,
+        max_replicas=int(_opcao(config, "HA_MAX_REPLICAS", 16)),
+        tenant=monitor.tenant,
+    )
+    checkpoints = DatabaseCheckpointStore(eleicao, monitor.tenant)
+    if monitor.checkpoints is not None:
+        logging.info("Modo HA ativo: CHECKPOINT_FILE ignorado, checkpoints no banco")
+    monitor.checkpoints = checkpoints
+    monitor.eleicao = eleicao
+    monitor.envios = DatabaseSendLog(
+        eleicao, retencao_dias=float(_opcao(config, "HA_ENVIOS_RETENCAO_DIAS", 7))
+    )
+
+    def so_lider(job, func):
+        def tarefa():
+            if not eleicao.e_lider(job.name):
+                return 0
+            return func()
+
+        return tarefa
+
+    for job in scheduler.jobs:
+        job.func = so_lider(job, job.func)
+
+    def ocupados():
+        # Tipos com busca em andamento ou posição ainda não confirmada não
+        # podem mudar de réplica, senão o novo líder releria os mesmos eventos
+        rodando = {job.name for job in scheduler.jobs if job.running}
+        return rodando | checkpoints.pendentes()
+
+    def travado():
+        agora = time.monotonic()
+        return any(
+            job.started is not None and agora - job.started > travamento
+            for job in scheduler.jobs
+        )
+
+    eleicao.iniciar(ocupados, scheduler.antecipar, travado)
+    logging.info(f"Modo HA ativo para {[job.name for job in scheduler.jobs]}")
+
+
+def __main__():
+    """Função principal para executar o monitoramento."""
+    if os.getenv("INSTANCIAS_FILE"):
+        configs = carregar_instancias(os.getenv("INSTANCIAS_FILE"))
+        logging.info(f"Modo multi-instância: {len(configs)} instâncias do GLPI")
+    else:
+        configs = [carregar_config()]
+    if os.getenv("METRICS_PORT"):
+        metricas.iniciar_servidor(int(os.getenv("METRICS_PORT")))
+    outbox = None
+    if os.getenv("OUTBOX_FILE"):
+        from services.outbox import NotificationOutbox
+
+        outbox = NotificationOutbox(os.getenv("OUTBOX_FILE"))
+    dispatcher = NotificationDispatcher(
+        workers=int(os.getenv("NOTIFICACAO_WORKERS") or 4),
+        queue_size=int(os.getenv("NOTIFICACAO_FILA_MAX") or 1000),
+        max_retries=int(os.getenv("NOTIFICACAO_TENTATIVAS") or 3),
+        outbox=outbox,
+    )
+    dispatcher.start()
+    # Com agrupamento ou limite de envios, as notificações passam pelo
+    # agrupador antes de chegar ao dispatcher
+    notificador = dispatcher
+    janela = float(os.getenv("NOTIFICACAO_JANELA") or 0)
+    limite_telefone = float(os.getenv("NOTIFICACAO_LIMITE_TELEFONE") or 0) or None
+    limite_global = float(os.getenv("NOTIFICACAO_LIMITE_GLOBAL") or 0) or None
+    if janela or limite_telefone or limite_global:
+        from services.agrupador import NotificationCoalescer
+
+        notificador = NotificationCoalescer(
+            dispatcher,
+            janela=janela,
+            limite_telefone=limite_telefone,
+            limite_global=limite_global,
+            max_itens=int(os.getenv("NOTIFICACAO_RESUMO_MAX") or 10),
+        )
+        notificador.start()
+    if outbox is not None:
+        pendentes = outbox.pendentes()
+        if pendentes:
+            logging.info(f"Reenviando {len(pendentes)} notificações pendentes do outbox")
+        for outbox_id, mensagem, phone in pendentes:
+            notificador.submit(mensagem, phone, outbox_id=outbox_id)
+    retencao_dias = float(os.getenv("OUTBOX_RETENCAO_DIAS") or 7)
+    instancias = [criar_instancia(config, notificador, outbox) for config in configs]
+
+    def manutencao():
+        for monitor, scheduler in instancias:
+            prefixo = f"[{monitor.tenant}] " if monitor.tenant else ""
+            logging.info(f"{prefixo}Agendador: {scheduler.stats()}")
+            logging.info(f"{prefixo}Pool de conexões: {monitor.pool_stats()}")
+            logging.info(f"{prefixo}Diretório de usuários: {monitor.directory.stats()}")
+            if monitor.eleicao is not None:
+                logging.info(f"{prefixo}Liderança: {monitor.eleicao.stats()}")
+            if monitor.envios is not None:
+                monitor.envios.purgar()
+        logging.info(f"Notificações: {dispatcher.stats()}")
+        if notificador is not dispatcher:
+            logging.info(f"Agrupador de notificações: {notificador.stats()}")
+        logging.info(f"Métricas (quantidade, média em s): {metricas.resumo()}")
+        if outbox is not None:
+            removidas = outbox.compactar(retencao_dias)
+            if removidas:
+                logging.info(f"Outbox: {removidas} registros antigos removidos")
+        return 0
+
+    for monitor, scheduler in instancias:
+        logging.info(f"Conectando ao banco de dados GLPI: {monitor.db_config['host']}")
+        threading.Thread(
+            target=scheduler.run_forever,
+            name=f"instancia-{monitor.tenant or 'glpi'}",
+            daemon=True,
+        ).start()
+    geral = Scheduler(max_workers=1)
+    geral.add_job("manutencao", manutencao, 180, 180, 180)
+    geral.run_forever()
 
 
 if __name__ == "__main__":
-    logging.info("Monitor de banco iniciado")
-    __main__()
+    parser = argparse.ArgumentParser(description="Monitor de eventos do GLPI")
+    parser.add_argument(
+        "--instalar-captura",
+        action="store_true",
+        help="cria a tabela db_monitor_events e os triggers do modo captura",
+    )
+    parser.add_argument(
+        "--remover-captura",
+        action="store_true",
+        help="remove os triggers do modo captura",
+    )
+    parser.add_argument(
+        "--profile-queries",
+        action="store_true",
+        help="mostra plano, tempo e linhas examinadas das consultas e sugere índices",
+    )
+    parser.add_argument(
+        "--janela",
+        type=int,
+        default=60,
+        help="minutos da janela de busca usada no perfil (padrão: 60)",
+    )
+    parser.add_argument(
+        "--detalhado", action="store_true", help="inclui o EXPLAIN de cada consulta"
+    )
+    parser.add_argument(
+        "--analisar",
+        action="store_true",
+        help="inclui o EXPLAIN ANALYZE (executa cada consulta mais uma vez)",
+    )
+    parser.add_argument(
+        "--aplicar-indices",
+        action="store_true",
+        help="cria os índices sugeridos, pedindo confirmação para cada um",
+    )
+    parser.add_argument(
+        "--amostrar",
+        type=float,
+        default=0,
+        metavar="SEGUNDOS",
+        help="reexecuta as consultas a cada SEGUNDOS e registra as que ficaram lentas",
+    )
+    args = parser.parse_args()
+    if args.instalar_captura or args.remover_captura:
+        configurar_captura(remover=args.remover_captura)
+    elif args.profile_queries:
+        perfilar_consultas(
+            args.janela,
+            detalhado=args.detalhado,
+            com_analise=args.analisar,
+            aplicar=args.aplicar_indices,
+            amostragem=args.amostrar,
+        )
+    else:
+        logging.info("Monitor de banco iniciado")
+        __main__()
@@ -0,0 +1,225 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AdaptiveJob:
+    """Tarefa periódica com intervalo próprio, ajustado a cada execução.
+
+    A função da tarefa retorna quantos itens processou, ou a lista deles.
+    Havendo itens, o intervalo encolhe (``shrink``); sem itens, com erro
+    ou com execução mais lenta que ``slow_seconds``, ele cresce (``grow``),
+    sempre dentro de ``[min_interval, max_interval]``.
+    """
+
+    def __init__(
+        self,
+        name,
+        func,
+        interval,
+        min_interval,
+        max_interval,
+        jitter=0.0,
+        shrink=0.5,
+        grow=1.5,
+        slow_seconds=None,
+        timeout=None,
+    ):
+        self.name = name
+        self.func = func
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min(max(interval, min_interval), max_interval)
+        self.initial_interval = self.interval
+        self.jitter = jitter
+        self.shrink = shrink
+        self.grow = grow
+        self.slow_seconds = slow_seconds
+        self.timeout = timeout
+        self.running = False
+        self.started = None
+        self.base = time.monotonic()
+        self.next_run = self.base
+        self.last_duration = 0.0
+        self.runs = 0
+        self.skipped = 0
+
+    def _ajustar(self, resultado, duracao):
+        if isinstance(resultado, (list, tuple)):
+            resultado = len(resultado)
+        if resultado is None or (
+            self.slow_seconds is not None and duracao > self.slow_seconds
+        ):
+            fator = self.grow
+        elif resultado > 0:
+            fator = self.shrink
+        else:
+            fator = self.grow
+        self.interval = min(
+            self.max_interval, max(self.min_interval, self.interval * fator)
+        )
+
+    def _agendar(self, agora):
+        """Calcula o próximo horário a partir do anterior, sem acumular atraso.
+
+        Se a execução passou de um ou mais horários, eles são descartados
+        em vez de executados em sequência.
+        """
+        self.base += self.interval
+        if self.base <= agora:
+            perdidos = int((agora - self.base) // self.interval) + 1
+            self.skipped += perdidos
+            self.base += perdidos * self.interval
+            logging.warning(
+                f"Tarefa {self.name} atrasada, {perdidos} execução(ões) agrupada(s)"
+            )
+        self.next_run = self.base + random.uniform(0, self.jitter * self.interval)
+
+    def antecipar(self):
+        """Volta ao intervalo inicial e torna a tarefa vencida agora."""
+        self.interval = self.initial_interval
+        self.base = self.next_run = time.monotonic()
+
+    def run(self):
+        inicio = self.started = time.monotonic()
+        try:
+            resultado = self.func()
+        except Exception as e:
+            logging.error(f"Erro na tarefa {self.name}: {e}")
+            resultado = None
+        fim = time.monotonic()
+        self.last_duration = fim - inicio
+        self.runs += 1
+        self._ajustar(resultado, self.last_duration)
+        self._agendar(fim)
+        self.started = None
+        self.running = False
+        return resultado
+
+    def stats(self):
+        return {
+            "intervalo": round(self.interval, 1),
+            "execucoes": self.runs,
+            "agrupadas": self.skipped,
+            "ultima_duracao": round(self.last_duration, 3),
+        }
+
+
+class Scheduler:
+    """Executa tarefas ``AdaptiveJob`` pelo relógio monotônico.
+
+    As tarefas vencidas rodam em paralelo, em até ``max_workers`` threads.
+    O laço nunca espera uma tarefa terminar: a cada volta entrega juntos a
+    ``on_results`` os resultados das tarefas que terminaram e inicia as
+    vencidas, então uma tarefa demorada não atrasa o início nem a entrega
+    das outras. Uma tarefa que passa do seu ``timeout`` é registrada no log
+    e tem o resultado entregue quando terminar. Enquanto estiver rodando,
+    ou com o resultado ainda não entregue, ela não é agendada de novo.
+    """
+
+    def __init__(self, max_workers=4, on_results=None):
+        self.jobs = []
+        self.on_results = on_results
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="agendador"
+        )
+        self._results_lock = threading.Lock()
+        # Tarefas iniciadas com resultado ainda não entregue: [job, future, prazo]
+        self._rodando = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def add_job(self, name, func, interval, min_interval, max_interval, **kwargs):
+        job = AdaptiveJob(name, func, interval, min_interval, max_interval, **kwargs)
+        self.jobs.append(job)
+        return job
+
+    def _entregar(self, resultados):
+        if self.on_results is None or not resultados:
+            return
+        with self._results_lock:
+            try:
+                self.on_results(resultados)
+            except Exception as e:
+                logging.error(f"Erro ao tratar resultados do agendador: {e}")
+
+    def _recolher(self):
+        """Entrega os resultados das tarefas que terminaram."""
+        agora = time.monotonic()
+        concluidas = []
+        for item in list(self._rodando):
+            job, future, prazo = item
+            if future.done():
+                self._rodando.remove(item)
+                concluidas.append((job, future.result()))
+            elif prazo is not None and agora >= prazo:
+                logging.warning(
+                    f"Tarefa {job.name} excedeu {job.timeout}s, seguindo sem ela"
+                )
+                # Avisa uma vez só; o resultado é entregue quando terminar
+                item[2] = None
+        self._entregar(concluidas)
+
+    def run_pending(self):
+        """Entrega os resultados prontos e inicia as tarefas vencidas, sem esperá-las.
+
+        Retorna quantas tarefas foram iniciadas.
+        """
+        self._recolher()
+        agora = time.monotonic()
+        ocupadas = {id(job) for job, _, _ in self._rodando}
+        vencidas = sorted(
+            (
+                job
+                for job in self.jobs
+                if not job.running and id(job) not in ocupadas and job.next_run <= agora
+            ),
+            key=lambda job: job.next_run,
+        )
+        for job in vencidas:
+            job.running = True
+            future = self._executor.submit(job.run)
+            prazo = agora + job.timeout if job.timeout is not None else None
+            self._rodando.append([job, future, prazo])
+            # O fim de uma tarefa acorda o laço para entregar o resultado
+            future.add_done_callback(lambda _: self._wake.set())
+        return len(vencidas)
+
+    def _proxima_volta(self):
+        """Instante da próxima tarefa vencida ou do próximo timeout."""
+        ocupadas = {id(job) for job, _, _ in self._rodando}
+        horarios = [
+            job.next_run
+            for job in self.jobs
+            if not job.running and id(job) not in ocupadas
+        ]
+        horarios += [prazo for _, _, prazo in self._rodando if prazo is not None]
+        return min(horarios) if horarios else time.monotonic() + 0.5
+
+    def run_forever(self):
+        try:
+            while not self._stop.is_set():
+                # Limpo antes de recolher, para não perder o aviso de uma
+                # tarefa que termine durante a volta
+                self._wake.clear()
+                self.run_pending()
+                self._wake.wait(max(0.0, self._proxima_volta() - time.monotonic()))
+        finally:
+            self._executor.shutdown(wait=True)
+            self._recolher()
+
+    def antecipar(self, name):
+        """Executa já a tarefa ``name``, acordando o laço do agendador."""
+        for job in self.jobs:
+            if job.name == name:
+                job.antecipar()
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self):
+        return {job.name: job.stats() for job in self.jobs}
@@ -0,0 +1,248 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from services import metricas
+
+
+class TokenBucket:
+    """Balde de fichas: ``taxa`` fichas por segundo, acumulando até ``capacidade``."""
+
+    def __init__(self, taxa, capacidade):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.fichas = capacidade
+        self.atualizado = time.monotonic()
+
+    def _reabastecer(self, agora):
+        decorrido = agora - self.atualizado
+        if decorrido > 0:
+            self.fichas = min(self.capacidade, self.fichas + decorrido * self.taxa)
+            self.atualizado = agora
+
+    def disponivel(self, agora):
+        self._reabastecer(agora)
+        return self.fichas >= 1
+
+    def consumir(self, agora):
+        """Retira uma ficha. Retorna False, sem retirar, se não houver."""
+        if not self.disponivel(agora):
+            return False
+        self.fichas -= 1
+        return True
+
+    def espera(self, agora):
+        """Segundos até haver uma ficha."""
+        self._reabastecer(agora)
+        return max(0.0, (1 - self.fichas) / self.taxa)
+
+    def cheio(self, agora):
+        self._reabastecer(agora)
+        return self.fichas >= self.capacidade
+
+
+class _Grupo:
+    __slots__ = ("inicio", "itens")
+
+    def __init__(self, inicio):
+        self.inicio = inicio
+        # Pares (mensagem, outbox_id)
+        self.itens = []
+
+
+def montar_resumo(mensagens):
+    """Junta as mensagens de um destinatário numa só notificação."""
+    if len(mensagens) == 1:
+        return mensagens[0]
+    separador = "\n" + "—" * 10 + "\n"
+    return (
+        f"📬 {len(mensagens)} atualizações nos seus chamados\n\n"
+        + separador.join(mensagem.rstrip("\n") for mensagem in mensagens)
+        + "\n"
+    )
+
+
+class NotificationCoalescer:
+    """Agrupa as notificações por telefone antes de entregá-las ao dispatcher.
+
+    As mensagens de um mesmo telefone que chegam dentro de ``janela``
+    segundos da primeira viram um único resumo (até ``max_itens`` por
+    resumo). A liberação respeita um limite por telefone
+    (``limite_telefone`` envios por minuto) e um global (``limite_global``
+    envios por segundo): sem ficha, o grupo fica adiado e continua
+    acumulando mensagens, nunca é descartado. Um grupo também espera
+    enquanto a fila da sua instância no dispatcher estiver cheia, sem
+    segurar a liberação das outras instâncias. ``submit`` tem a mesma
+    assinatura do dispatcher e bloqueia quando a instância tem
+    ``max_pendentes`` mensagens retidas.
+    """
+
+    def __init__(
+        self,
+        dispatcher,
+        janela=30.0,
+        limite_telefone=None,
+        limite_global=None,
+        max_itens=10,
+        max_pendentes=10000,
+    ):
+        self.dispatcher = dispatcher
+        self.janela = janela
+        self.limite_telefone = limite_telefone
+        self.max_itens = max_itens
+        self.max_pendentes = max_pendentes
+        self._global = None
+        if limite_global:
+            self._global = TokenBucket(limite_global, max(1.0, limite_global))
+        self._buckets = {}
+        self._grupos = OrderedDict()
+        self._pendentes = 0
+        self._pendentes_tenant = {}
+        self._cond = threading.Condition()
+        self._parar = False
+        self._thread = None
+        self._stats = {"recebidas": 0, "resumos": 0, "adiamentos": 0}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="agrupador", daemon=True)
+        self._thread.start()
+
+    def submit(self, mensagem, phone, outbox_id=None, timeout=None, tenant=None):
+        """Retém a mensagem no grupo do telefone até a liberação.
+
+        Os grupos e o limite de mensagens retidas são separados por
+        instância do GLPI (``tenant``); o limite por telefone vale para
+        todas elas.
+        """
+        with self._cond:
+            if self._pendentes_tenant.get(tenant, 0) >= self.max_pendentes:
+                logging.warning("Agrupador de notificações cheio, aguardando espaço")
+                if not self._cond.wait_for(
+                    lambda: self._pendentes_tenant.get(tenant, 0) < self.max_pendentes,
+                    timeout,
+                ):
+                    raise TimeoutError("Agrupador de notificações cheio")
+            grupo = self._grupos.get((tenant, phone))
+            if grupo is None:
+                grupo = self._grupos[(tenant, phone)] = _Grupo(time.monotonic())
+            grupo.itens.append((mensagem, outbox_id))
+            self._pendentes += 1
+            self._pendentes_tenant[tenant] = self._pendentes_tenant.get(tenant, 0) + 1
+            self._stats["recebidas"] += 1
+            self._cond.notify_all()
+
+    def _bucket(self, phone):
+        bucket = self._buckets.get(phone)
+        if bucket is None:
+            # Permite uma rajada de até um minuto de envios
+            capacidade = max(1.0, self.limite_telefone)
+            bucket = self._buckets[phone] = TokenBucket(
+                self.limite_telefone / 60, capacidade
+            )
+        return bucket
+
+    def _liberar(self, agora, forcar=False):
+        """Libera os grupos vencidos com ficha disponível.
+
+        Retorna ``(lotes, espera)``: os resumos a enviar e quanto aguardar
+        até a próxima liberação possível.
+        """
+        lotes = []
+        espera = 0.5
+        # Vagas na fila do dispatcher de cada instância: sem vaga, os grupos
+        # da instância esperam sem bloquear a liberação das outras
+        vagas = {}
+        # Grupos mais antigos primeiro
+        for chave, grupo in list(self._grupos.items()):
+            tenant, phone = chave
+            vence = grupo.inicio + self.janela
+            if not forcar and vence > agora:
+                espera = min(espera, vence - agora)
+                continue
+            if tenant not in vagas:
+                vagas[tenant] = self.dispatcher.vagas(tenant)
+            if vagas[tenant] <= 0:
+                espera = min(espera, 0.1)
+                continue
+            if self._global is not None and not self._global.disponivel(agora):
+                self._stats["adiamentos"] += 1
+                metricas.NOTIFICATION_DEFERRED.inc(limite="global")
+                espera = min(espera, self._global.espera(agora))
+                break
+            if self.limite_telefone:
+                bucket = self._bucket(phone)
+                if not bucket.consumir(agora):
+                    self._stats["adiamentos"] += 1
+                    metricas.NOTIFICATION_DEFERRED.inc(limite="telefone")
+                    espera = min(espera, bucket.espera(agora))
+                    continue
+            if self._global is not None:
+                self._global.consumir(agora)
+            itens = grupo.itens[: self.max_itens]
+            if len(grupo.itens) > self.max_itens:
+                # O excedente fica para o próximo resumo, já vencido
+                grupo.itens = grupo.itens[self.max_itens :]
+                self._grupos.move_to_end(chave)
+            else:
+                del self._grupos[chave]
+            self._pendentes -= len(itens)
+            self._pendentes_tenant[tenant] -= len(itens)
+            if not self._pendentes_tenant[tenant]:
+                del self._pendentes_tenant[tenant]
+            vagas[tenant] -= 1
+            self._stats["resumos"] += 1
+            lotes.append((chave, itens))
+        return lotes, espera
+
+    def _descartar_buckets(self, agora):
+        # Baldes cheios equivalem a baldes novos: podem sair da memória
+        ativos = {phone for _, phone in self._grupos}
+        for phone in [
+            phone
+            for phone, bucket in self._buckets.items()
+            if phone not in ativos and bucket.cheio(agora)
+        ]:
+            del self._buckets[phone]
+
+    def _loop(self):
+        ultima_limpeza = time.monotonic()
+        while True:
+            with self._cond:
+                agora = time.monotonic()
+                lotes, espera = self._liberar(agora, forcar=self._parar)
+                if agora - ultima_limpeza > 60:
+                    self._descartar_buckets(agora)
+                    ultima_limpeza = agora
+                if lotes:
+                    self._cond.notify_all()
+                elif self._parar and not self._grupos:
+                    return
+                else:
+                    self._cond.wait(timeout=max(espera, 0.01))
+                    continue
+            for (tenant, phone), itens in lotes:
+                metricas.NOTIFICATION_DIGEST_SIZE.observe(len(itens))
+                outbox_ids = [outbox_id for _, outbox_id in itens if outbox_id is not None]
+                self.dispatcher.submit(
+                    montar_resumo([mensagem for mensagem, _ in itens]),
+                    phone,
+                    outbox_id=outbox_ids or None,
+                    tenant=tenant,
+                )
+
+    def stop(self):
+        """Libera tudo o que está retido, respeitando os limites, e encerra."""
+        with self._cond:
+            self._parar = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._stats,
+                "pendentes": self._pendentes,
+                "telefones": len(self._grupos),
+            }
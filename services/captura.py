@@ -0,0 +1,120 @@
+import logging
+
+# Tabela alimentada pelos triggers: só acrescenta linhas, lida pelo id
+TABELA = """
+    CREATE TABLE IF NOT EXISTS db_monitor_events (
+        id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+        event_type VARCHAR(16) NOT NULL,
+        item_id INT UNSIGNED NOT NULL,
+        ts TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+        PRIMARY KEY (id)
+    ) ENGINE=InnoDB
+"""
+
+# Nome do trigger -> definição. Cada trigger grava só a chave do evento
+# (a mesma usada pelas consultas do monitor); os joins ficam para a leitura.
+TRIGGERS = {
+    "db_monitor_tickets_ai": """
+        AFTER INSERT ON glpi_tickets FOR EACH ROW
+        INSERT INTO db_monitor_events (event_type, item_id)
+        VALUES ('tickets', NEW.id)
+    """,
+    "db_monitor_tickets_au": """
+        AFTER UPDATE ON glpi_tickets FOR EACH ROW
+        INSERT INTO db_monitor_events (event_type, item_id)
+        SELECT 'closures', NEW.id FROM DUAL
+        WHERE NEW.status = 6 AND OLD.status <> 6
+    """,
+    "db_monitor_followups_ai": """
+        AFTER INSERT ON glpi_itilfollowups FOR EACH ROW
+        INSERT INTO db_monitor_events (event_type, item_id)
+        SELECT 'followups', NEW.id FROM DUAL
+        WHERE NEW.itemtype = 'Ticket' AND NEW.is_private = 0
+    """,
+    "db_monitor_validations_ai": """
+        AFTER INSERT ON glpi_ticketvalidations FOR EACH ROW
+        INSERT INTO db_monitor_events (event_type, item_id)
+        SELECT 'validations', NEW.id FROM DUAL
+        WHERE NEW.status = 2
+    """,
+    "db_monitor_validations_au": """
+        AFTER UPDATE ON glpi_ticketvalidations FOR EACH ROW
+        INSERT INTO db_monitor_events (event_type, item_id)
+        SELECT 'validations', NEW.id FROM DUAL
+        WHERE NEW.status = 2 AND OLD.status <> 2
+    """,
+}
+
+
+def instalar(cursor):
+    """Cria a tabela de eventos e (re)cria os triggers de captura.
+
+    Exige o privilégio TRIGGER e, com binlog ativo, SUPER ou
+    ``log_bin_trust_function_creators``.
+    """
+    cursor.execute(TABELA)
+    for nome, definicao in TRIGGERS.items():
+        cursor.execute(f"DROP TRIGGER IF EXISTS {nome}")
+        cursor.execute(f"CREATE TRIGGER {nome} {definicao}")
+        logging.info(f"Trigger {nome} instalado")
+
+
+def remover(cursor):
+    """Remove os triggers de captura. A tabela de eventos é mantida."""
+    for nome in TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {nome}")
+        logging.info(f"Trigger {nome} removido")
+
+
+def posicao_inicial(cursor, minutos=3):
+    """Maior id capturado há mais de ``minutos`` minutos, para a primeira leitura.
+
+    O corte é calculado no servidor: ``ts`` é exibido no fuso da sessão,
+    que não precisa ser o horário de São Paulo.
+    """
+    cursor.execute(
+        "SELECT COALESCE(MAX(id), 0) AS pos FROM db_monitor_events "
+        "WHERE ts < NOW(6) - INTERVAL %s MINUTE",
+        (minutos,),
+    )
+    return cursor.fetchone()["pos"]
+
+
+def ler_mudancas(cursor, apos_id, limite, espera=0):
+    """Lê até ``limite`` mudanças após ``apos_id``, pela chave primária.
+
+    Só são lidas as mudanças capturadas há mais de ``espera`` segundos: o
+    GLPI grava o ticket antes dos seus solicitantes e técnicos
+    (``glpi_tickets_users``), e um ticket lido logo após o insert sairia
+    sem destinatários. Retorna ``({event_type: [item_id, ...]}, ultimo_id)``,
+    sem ids repetidos e na ordem de captura. Sem mudanças, ``ultimo_id`` é
+    ``apos_id``.
+    """
+    cursor.execute(
+        "SELECT id, event_type, item_id FROM db_monitor_events "
+        "WHERE id > %s AND ts < NOW(6) - INTERVAL %s SECOND ORDER BY id LIMIT %s",
+        (apos_id, espera, limite),
+    )
+    mudancas = {}
+    ultimo_id = apos_id
+    for row in cursor.fetchall():
+        mudancas.setdefault(row["event_type"], {})[row["item_id"]] = None
+        ultimo_id = row["id"]
+    return {tipo: list(ids) for tipo, ids in mudancas.items()}, ultimo_id
+
+
+def purgar(cursor, ate_id, lote=1000):
+    """Apaga as mudanças já consumidas (``id <= ate_id``) em lotes.
+
+    Lotes pequenos mantêm os bloqueios curtos para os triggers que
+    continuam inserindo. Retorna o total de linhas apagadas.
+    """
+    total = 0
+    while True:
+        cursor.execute(
+            "DELETE FROM db_monitor_events WHERE id <= %s ORDER BY id LIMIT %s",
+            (ate_id, lote),
+        )
+        total += cursor.rowcount
+        if cursor.rowcount < lote:
+            return total
@@ -2,6 +2,7 @@ import requests
 import logging
 import os
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 
 load_dotenv()
 
@@ -11,20 +12,37 @@ API_URL = (
 )
 
 
-def enviar_notificacao(mensagem, phone):
-    """Envia notificação via API para o número de telefone informado."""
+def criar_sessao(pool_size=10):
+    """Cria uma sessão HTTP com pool de conexões keep-alive."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_session = criar_sessao()
+
+
+def enviar_notificacao(mensagem, phone, session=None):
+    """Envia notificação via API para o número de telefone informado.
+
+    Retorna o status HTTP da resposta, ou None se a requisição falhou.
+    """
     payload = {
         "message": mensagem,
         "phone": phone,
     }
-    logging.warning(f"Enviando notificação para {phone}: {mensagem} | url: {API_URL}")
+    logging.debug(f"Enviando notificação para {phone}: {mensagem} | url: {API_URL}")
     try:
-        response = requests.post(API_URL, json=payload, timeout=5)
+        response = (session or _session).post(API_URL, json=payload, timeout=5)
         if response.status_code == 200:
-            logging.info(f"Notificação enviada para {phone}")
+            logging.debug(f"Notificação enviada para {phone}")
         else:
             logging.warning(
                 f"Falha ao enviar notificação: {response.status_code} - {response.text}"
             )
+        return response.status_code
     except Exception as e:
         logging.error(f"Erro ao enviar notificação: {e}")
+        return None
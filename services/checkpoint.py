@@ -0,0 +1,275 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+
+import pymysql
+
+
+class CheckpointStore:
+    """Guarda em disco a última posição processada de cada tipo de evento.
+
+    As posições lidas pelo monitor ficam pendentes em memória até que
+    ``confirmar`` seja chamado, depois que as notificações foram tratadas.
+    Assim um reinício retoma do último ponto confirmado em vez de perder
+    ou reenviar eventos.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._posicoes = self._carregar()
+        self._pendentes = {}
+
+    def _carregar(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as arquivo:
+                return json.load(arquivo)
+        except (OSError, ValueError) as e:
+            logging.error(f"Erro ao ler checkpoints de {self.path}: {e}")
+            return {}
+
+    def get(self, tipo):
+        """Retorna a posição mais recente (pendente ou confirmada) do tipo."""
+        with self._lock:
+            if tipo in self._pendentes:
+                return self._pendentes[tipo]
+            return self._posicoes.get(tipo)
+
+    def avancar(self, tipo, posicao):
+        """Registra uma nova posição para o tipo, ainda sem gravar em disco."""
+        with self._lock:
+            self._pendentes[tipo] = posicao
+
+    def confirmar(self, tipo=None):
+        """Grava de forma atômica as posições pendentes no arquivo.
+
+        Com ``tipo``, só a posição desse tipo de evento é confirmada.
+        """
+        with self._lock:
+            if tipo is None:
+                confirmadas = self._pendentes
+            elif tipo in self._pendentes:
+                confirmadas = {tipo: self._pendentes[tipo]}
+            else:
+                return
+            if not confirmadas:
+                return
+            posicoes = {**self._posicoes, **confirmadas}
+            diretorio = os.path.dirname(self.path)
+            if diretorio:
+                os.makedirs(diretorio, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as arquivo:
+                    json.dump(posicoes, arquivo)
+                    arquivo.flush()
+                    os.fsync(arquivo.fileno())
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logging.error(f"Erro ao gravar checkpoints em {self.path}: {e}")
+                return
+            self._posicoes = posicoes
+            for chave in confirmadas.keys() & self._pendentes.keys():
+                if self._pendentes[chave] == confirmadas[chave]:
+                    del self._pendentes[chave]
+
+
+class DatabaseCheckpointStore:
+    """Checkpoints compartilhados entre réplicas, numa tabela do próprio banco.
+
+    Mesma interface do ``CheckpointStore``. A gravação de cada posição só
+    acontece se a réplica ainda for líder do tipo (``LeaderElection``), na
+    mesma conexão que segura o lock: uma réplica que perdeu a liderança
+    descarta a posição em vez de sobrescrever a do novo líder.
+    """
+
+    TABELA = """
+        CREATE TABLE IF NOT EXISTS db_monitor_checkpoints (
+            instancia VARCHAR(64) NOT NULL,
+            tipo VARCHAR(32) NOT NULL,
+            posicao TEXT NOT NULL,
+            atualizado TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (instancia, tipo)
+        ) ENGINE=InnoDB
+    """
+
+    def __init__(self, eleicao, instancia=""):
+        self.eleicao = eleicao
+        self.instancia = instancia
+        self.path = "db_monitor_checkpoints"
+        self._lock = threading.Lock()
+        self._pendentes = {}
+        self._tabela_criada = False
+
+    def _garantir_tabela(self):
+        if not self._tabela_criada:
+            self.eleicao.consultar(self.TABELA)
+            self._tabela_criada = True
+
+    def get(self, tipo):
+        """Retorna a posição pendente do tipo ou, sem ela, a gravada no banco.
+
+        A posição gravada é sempre relida, pois outra réplica pode tê-la
+        avançado enquanto era a líder.
+        """
+        with self._lock:
+            if tipo in self._pendentes:
+                return self._pendentes[tipo]
+        self._garantir_tabela()
+        rows = self.eleicao.consultar(
+            "SELECT posicao FROM db_monitor_checkpoints WHERE instancia = %s AND tipo = %s",
+            (self.instancia, tipo),
+        )
+        return json.loads(rows[0]["posicao"]) if rows else None
+
+    def avancar(self, tipo, posicao):
+        """Registra uma nova posição para o tipo, ainda sem gravar no banco."""
+        with self._lock:
+            self._pendentes[tipo] = posicao
+
+    def pendentes(self):
+        """Tipos com posição ainda não confirmada."""
+        with self._lock:
+            return set(self._pendentes)
+
+    def confirmar(self, tipo=None):
+        """Grava as posições pendentes, só para os tipos de que ainda é líder.
+
+        Com ``tipo``, só a posição desse tipo de evento é confirmada.
+        """
+        with self._lock:
+            if tipo is None:
+                confirmadas = dict(self._pendentes)
+            elif tipo in self._pendentes:
+                confirmadas = {tipo: self._pendentes[tipo]}
+            else:
+                return
+        for chave, posicao in confirmadas.items():
+            try:
+                self._garantir_tabela()
+                gravado = self.eleicao.executar_se_lider(
+                    self.eleicao.tipo_do_lock(chave),
+                    "INSERT INTO db_monitor_checkpoints (instancia, tipo, posicao) "
+                    "VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE posicao = VALUES(posicao)",
+                    (self.instancia, chave, json.dumps(posicao)),
+                )
+            except pymysql.MySQLError as e:
+                logging.error(f"Erro ao gravar checkpoint de {chave}: {e}")
+                # Sem a conexão a réplica perdeu os locks: a posição pendente
+                # fica para o próximo líder reler do banco
+                gravado = False
+                if self.eleicao.tipo_do_lock(chave) in self.eleicao.lider:
+                    continue
+            with self._lock:
+                if not gravado:
+                    # O novo líder relê a posição confirmada e segue dela
+                    logging.warning(
+                        f"Checkpoint de {chave} descartado: réplica não é mais líder"
+                    )
+                if self._pendentes.get(chave) == posicao:
+                    del self._pendentes[chave]
+
+
+class DatabaseSendLog:
+    """Registro compartilhado das notificações já reivindicadas pelas réplicas.
+
+    Antes de ir para o outbox/dispatcher, cada notificação tem a sua chave
+    de idempotência gravada em ``db_monitor_envios`` pela réplica líder do
+    tipo, na conexão que segura o lock e logo após conferir a liderança.
+    Só seguem as chaves que essa réplica gravou: uma réplica que perdeu o
+    lock no meio de um lote não envia nada, e o novo líder, ao reler os
+    mesmos eventos, encontra as chaves já gravadas e não os reenvia.
+
+    A chave é reivindicada antes do envio: se a réplica morrer entre as
+    duas coisas, o envio depende do outbox local dela (``OUTBOX_FILE``).
+    """
+
+    TABELA = """
+        CREATE TABLE IF NOT EXISTS db_monitor_envios (
+            chave CHAR(40) CHARACTER SET ascii NOT NULL,
+            lote CHAR(32) CHARACTER SET ascii NOT NULL,
+            criado TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (chave),
+            KEY lote (lote),
+            KEY criado (criado)
+        ) ENGINE=InnoDB
+    """
+
+    def __init__(self, eleicao, retencao_dias=7, lote=500):
+        self.eleicao = eleicao
+        self.retencao_dias = retencao_dias
+        self.lote = lote
+        self._tabela_criada = False
+
+    def _garantir_tabela(self):
+        if not self._tabela_criada:
+            self.eleicao.consultar(self.TABELA)
+            self._tabela_criada = True
+
+    def _reivindicar_lote(self, tipo, hashes):
+        lote = uuid.uuid4().hex
+        marcadores = ", ".join(["(%s, %s)"] * len(hashes))
+        resultados = self.eleicao.executar_lote_se_lider(
+            tipo,
+            [
+                (
+                    f"INSERT IGNORE INTO db_monitor_envios (chave, lote) VALUES {marcadores}",
+                    tuple(valor for chave in hashes for valor in (chave, lote)),
+                ),
+                ("SELECT chave FROM db_monitor_envios WHERE lote = %s", (lote,)),
+            ],
+        )
+        if resultados is None:
+            return None
+        return {row["chave"] for row in resultados[1]}
+
+    def reivindicar(self, tipos):
+        """Grava as chaves ``{chave: event_type}`` e retorna as que esta réplica levou.
+
+        Ficam de fora as chaves já gravadas antes (por esta ou outra
+        réplica) e as dos tipos de que a réplica não é mais líder.
+        """
+        por_lock = {}
+        for chave, event_type in tipos.items():
+            tipo = self.eleicao.tipo_do_lock(event_type)
+            hash_chave = hashlib.sha1(chave.encode()).hexdigest()
+            por_lock.setdefault(tipo, {})[hash_chave] = chave
+        reivindicadas = set()
+        for tipo, chaves in por_lock.items():
+            hashes = list(chaves)
+            try:
+                self._garantir_tabela()
+                for inicio in range(0, len(hashes), self.lote):
+                    gravadas = self._reivindicar_lote(
+                        tipo, hashes[inicio : inicio + self.lote]
+                    )
+                    if gravadas is None:
+                        logging.warning(
+                            f"{len(hashes) - inicio} notificações de {tipo} descartadas: "
+                            "réplica não é mais líder"
+                        )
+                        break
+                    reivindicadas.update(chaves[hash_chave] for hash_chave in gravadas)
+            except pymysql.MySQLError as e:
+                # Sem a conexão a réplica perdeu os locks e o checkpoint não
+                # é confirmado: o novo líder relê os eventos e os reivindica
+                logging.error(f"Erro ao reivindicar notificações de {tipo}: {e}")
+        return reivindicadas
+
+    def purgar(self, limite=10000):
+        """Remove as chaves mais antigas que ``retencao_dias``."""
+        try:
+            self._garantir_tabela()
+            self.eleicao.consultar(
+                "DELETE FROM db_monitor_envios "
+                "WHERE criado < NOW() - INTERVAL %s DAY LIMIT %s",
+                (self.retencao_dias, limite),
+            )
+        except pymysql.MySQLError as e:
+            logging.error(f"Erro ao remover registros antigos de db_monitor_envios: {e}")
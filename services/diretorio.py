@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+_SELECT_CONTATOS = """
+    SELECT
+        u.id,
+        CONCAT(u.firstname, ' ', u.realname) AS name,
+        u.phone,
+        e.email,
+        u.date_mod
+    FROM glpi_users AS u
+    LEFT JOIN glpi_useremails AS e
+    ON u.id = e.users_id
+    AND e.is_default = 1
+"""
+
+
+@dataclass(slots=True)
+class Contact:
+    name: str
+    phone: str
+    email: str
+
+
+class UserDirectory:
+    """Cache em memória de ``users_id -> Contact`` dos usuários do GLPI.
+
+    A carga inicial traz os usuários alterados mais recentemente, até
+    ``max_size``. Depois, a cada ``refresh_seconds``, só são relidos os
+    usuários com ``date_mod`` posterior à última leitura. Ids ausentes do
+    cache são buscados sob demanda, e o excedente é removido por LRU.
+    """
+
+    def __init__(self, max_size=50000, refresh_seconds=300):
+        self.max_size = max_size
+        self.refresh_seconds = refresh_seconds
+        self._contatos = OrderedDict()
+        self._lock = threading.Lock()
+        # Só uma busca relê o diretório; as demais aguardam e usam o resultado
+        self._refresh_lock = threading.Lock()
+        self._last_date_mod = None
+        self._next_refresh = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def _guardar(self, rows):
+        with self._lock:
+            for row in rows:
+                self._contatos[row["id"]] = Contact(
+                    row["name"], row["phone"], row["email"]
+                )
+                self._contatos.move_to_end(row["id"])
+                if row["date_mod"] is not None and (
+                    self._last_date_mod is None or row["date_mod"] > self._last_date_mod
+                ):
+                    self._last_date_mod = row["date_mod"]
+            while len(self._contatos) > self.max_size:
+                self._contatos.popitem(last=False)
+
+    def carregar(self, cursor):
+        """Carga inicial em lote dos usuários."""
+        cursor.execute(
+            _SELECT_CONTATOS + " ORDER BY u.date_mod DESC LIMIT %s", (self.max_size,)
+        )
+        rows = cursor.fetchall()
+        # Os mais recentes por último, para ficarem no fim da fila LRU
+        self._guardar(reversed(rows))
+        logging.info(f"Diretório de usuários carregado com {len(rows)} contatos")
+
+    def atualizar(self, cursor):
+        """Relê apenas os usuários alterados desde a última leitura."""
+        if self._last_date_mod is None:
+            self.carregar(cursor)
+            return
+        cursor.execute(
+            _SELECT_CONTATOS + " WHERE u.date_mod >= %s", (self._last_date_mod,)
+        )
+        self._guardar(cursor.fetchall())
+
+    def resolver(self, cursor, ids):
+        """Retorna ``{users_id: Contact}`` para os ids informados."""
+        if time.monotonic() >= self._next_refresh:
+            with self._refresh_lock:
+                if time.monotonic() >= self._next_refresh:
+                    self.atualizar(cursor)
+                    self._next_refresh = time.monotonic() + self.refresh_seconds
+        ids = {users_id for users_id in ids if users_id}
+        encontrados = {}
+        with self._lock:
+            for users_id in ids:
+                contato = self._contatos.get(users_id)
+                if contato is not None:
+                    self._contatos.move_to_end(users_id)
+                    encontrados[users_id] = contato
+            self.hits += len(encontrados)
+            self.misses += len(ids) - len(encontrados)
+        faltantes = ids - encontrados.keys()
+        if faltantes:
+            marcadores = ", ".join(["%s"] * len(faltantes))
+            cursor.execute(
+                _SELECT_CONTATOS + f" WHERE u.id IN ({marcadores})", tuple(faltantes)
+            )
+            rows = cursor.fetchall()
+            self._guardar(rows)
+            for row in rows:
+                encontrados[row["id"]] = Contact(
+                    row["name"], row["phone"], row["email"]
+                )
+        return encontrados
+
+    def stats(self):
+        with self._lock:
+            return {
+                "contatos": len(self._contatos),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
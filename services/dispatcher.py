@@ -0,0 +1,191 @@
+import logging
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+from services import metricas
+from services.chamada_notificacao import criar_sessao, enviar_notificacao
+
+
+class FairQueue:
+    """Fila limitada por chave, consumida em rodízio entre as chaves.
+
+    Cada chave (uma instância do GLPI) guarda até ``maxsize`` itens: ``put``
+    só bloqueia quem encheu a própria fila, e ``get`` alterna entre as
+    chaves com itens, então uma instância com um grande acúmulo de
+    notificações não atrasa as das outras.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._filas = OrderedDict()
+        self._cond = threading.Condition()
+        self._unfinished = 0
+
+    def _tamanho(self, chave):
+        fila = self._filas.get(chave)
+        return len(fila) if fila else 0
+
+    def put(self, item, chave=None, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(
+                lambda: self._tamanho(chave) < self.maxsize, timeout
+            ):
+                raise queue.Full
+            self._filas.setdefault(chave, deque()).append(item)
+            self._unfinished += 1
+            self._cond.notify_all()
+
+    def get(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._filas)
+            chave, fila = next(iter(self._filas.items()))
+            item = fila.popleft()
+            # A chave vai para o fim da vez, ou sai se esvaziou
+            del self._filas[chave]
+            if fila:
+                self._filas[chave] = fila
+            self._cond.notify_all()
+            return item
+
+    def task_done(self):
+        with self._cond:
+            self._unfinished -= 1
+            if not self._unfinished:
+                self._cond.notify_all()
+
+    def join(self):
+        with self._cond:
+            self._cond.wait_for(lambda: not self._unfinished)
+
+    def full(self, chave=None):
+        with self._cond:
+            return self._tamanho(chave) >= self.maxsize
+
+    def vagas(self, chave=None):
+        """Quantos itens ainda cabem na fila da chave."""
+        with self._cond:
+            return self.maxsize - self._tamanho(chave)
+
+    def qsize(self):
+        with self._cond:
+            return sum(len(fila) for fila in self._filas.values())
+
+
+class NotificationDispatcher:
+    """Entrega as notificações em segundo plano com um pool de workers.
+
+    As mensagens entram numa fila limitada por instância do GLPI
+    (``FairQueue``); quando a fila da instância enche, ``submit`` bloqueia e
+    o monitor dela deixa de consultar o banco até haver espaço. Os
+    workers compartilham uma sessão HTTP keep-alive e repetem envios que
+    não retornaram 200 com backoff exponencial e jitter.
+    """
+
+    def __init__(
+        self,
+        workers=4,
+        queue_size=1000,
+        max_retries=3,
+        backoff_base=1.0,
+        backoff_max=30.0,
+        outbox=None,
+    ):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.outbox = outbox
+        self.session = criar_sessao(pool_size=workers)
+        self._queue = FairQueue(queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats = {"enviadas": 0, "falhas": 0, "tentativas_extras": 0}
+
+    def start(self):
+        """Inicia os workers de envio."""
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker, name=f"notificacao-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, mensagem, phone, outbox_id=None, timeout=None, tenant=None):
+        """Enfileira uma notificação, bloqueando enquanto a fila estiver cheia.
+
+        Se ``outbox_id`` for informado, a linha correspondente do outbox é
+        marcada como entregue após o envio bem-sucedido. Uma mensagem que
+        agrupa várias notificações recebe a lista dos ids. ``tenant`` é a
+        instância do GLPI de origem, usada no rodízio da fila.
+        """
+        if self._queue.full(tenant):
+            logging.warning("Fila de notificações cheia, aguardando espaço")
+        self._queue.put((mensagem, phone, outbox_id), tenant, timeout=timeout)
+
+    def vagas(self, tenant=None):
+        """Quantas notificações da instância ainda cabem na fila sem bloquear."""
+        return self._queue.vagas(tenant)
+
+    def join(self):
+        """Aguarda até que todas as notificações enfileiradas sejam tratadas."""
+        self._queue.join()
+
+    def stop(self):
+        """Esvazia a fila e encerra os workers."""
+        self._queue.join()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "pendentes": self._queue.qsize()}
+
+    def _incr(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _backoff(self, attempt):
+        """Backoff exponencial com jitter completo."""
+        limite = min(self.backoff_max, self.backoff_base * 2**attempt)
+        return random.uniform(0, limite)
+
+    def _deliver(self, mensagem, phone):
+        """Envia uma mensagem, repetindo as falhas. Retorna True se entregue."""
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._incr("tentativas_extras")
+                metricas.NOTIFICATION_RETRIES.inc()
+                time.sleep(self._backoff(attempt))
+            with metricas.NOTIFICATION_SECONDS.time():
+                status = enviar_notificacao(mensagem, phone, session=self.session)
+            metricas.NOTIFICATION_RESPONSES.inc(status=status or "erro")
+            if status == 200:
+                return True
+        return False
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                mensagem, phone, outbox_id = item
+                if self._deliver(mensagem, phone):
+                    self._incr("enviadas")
+                    if outbox_id is not None and self.outbox is not None:
+                        self.outbox.marcar_entregue(outbox_id)
+                else:
+                    self._incr("falhas")
+                    logging.error(
+                        f"Notificação para {phone} não entregue após {self.max_retries + 1} tentativas"
+                    )
+            except Exception as e:
+                logging.error(f"Erro inesperado no envio de notificação: {e}")
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,126 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+
+# Colunas de cada consulta usadas para montar o evento de cada tipo.
+# "key" identifica o evento: as linhas repetidas pelos joins com
+# glpi_tickets_users/glpi_itilsolutions compartilham o mesmo valor.
+_CAMPOS = {
+    "tickets": {
+        "key": "id",
+        "ticket_id": "id",
+        "title": "name",
+        "date": "date_creation",
+        "recipient": "phone",
+    },
+    "closures": {
+        "key": "id",
+        "ticket_id": "id",
+        "title": "name",
+        "date": "date_mod",
+        "recipient": "phone",
+    },
+    "followups": {
+        "key": "id",
+        "ticket_id": "ticket_id",
+        "title": "ticket_title",
+        "date": "date_creation",
+        "recipient": "phone",
+        "author": "author_name",
+    },
+    "validations": {
+        "key": "validation_id",
+        "ticket_id": "id",
+        "title": "name",
+        "date": "date_mod",
+        "recipient": "validator_phone",
+        "author": "validator_name",
+        "comment": "comment_submission",
+    },
+}
+
+
+@dataclass(slots=True)
+class Event:
+    """Um evento do GLPI a notificar, já sem as linhas duplicadas dos joins."""
+
+    event_type: str
+    item_id: int
+    ticket_id: int
+    title: str
+    date: datetime
+    content: str = ""
+    author_name: str = None
+    comment: str = None
+    solution_id: int = None
+    requester_names: list = field(default_factory=list)
+    technician_names: list = field(default_factory=list)
+    recipients: list = field(default_factory=list)
+
+    @property
+    def requesters(self):
+        return ", ".join(self.requester_names)
+
+    def idempotency_key(self, phone):
+        """Chave de idempotência da notificação deste evento para ``phone``."""
+        if self.event_type == "closures":
+            # O mesmo ticket pode ser fechado de novo após ser reaberto
+            return f"closures:{self.ticket_id}:{self.date}:{phone}"
+        return f"{self.event_type}:{self.ticket_id}:{self.item_id}:{phone}"
+
+
+def _adicionar(lista, valor):
+    if valor and valor not in lista:
+        lista.append(valor)
+
+
+class EventAggregator:
+    """Agrupa em eventos as linhas de uma consulta que chegam em lotes.
+
+    As linhas de um mesmo evento precisam vir em sequência (as consultas
+    ordenam pela chave do evento). ``adicionar`` devolve os eventos já
+    completos; o último fica aberto até chegar uma linha de outro evento
+    ou até ``finalizar``. Solicitantes, técnicos e destinatários são
+    deduplicados e, nos fechamentos, fica apenas a solução mais recente.
+    """
+
+    def __init__(self, event_type):
+        self.event_type = event_type
+        self._campos = _CAMPOS[event_type]
+        self._atual = None
+
+    def _novo_evento(self, row):
+        campos = self._campos
+        return Event(
+            event_type=self.event_type,
+            item_id=row[campos["key"]],
+            ticket_id=row[campos["ticket_id"]],
+            title=row[campos["title"]],
+            date=row[campos["date"]],
+            content=row.get("content"),
+            author_name=row.get(campos.get("author")),
+            comment=row.get(campos.get("comment")),
+            solution_id=row.get("solution_id"),
+        )
+
+    def adicionar(self, rows):
+        """Processa um lote de linhas e retorna os eventos completos."""
+        prontos = []
+        campos = self._campos
+        for row in rows:
+            evento = self._atual
+            if evento is None or evento.item_id != row[campos["key"]]:
+                if evento is not None:
+                    prontos.append(evento)
+                evento = self._atual = self._novo_evento(row)
+            elif (row.get("solution_id") or 0) > (evento.solution_id or 0):
+                evento.solution_id = row["solution_id"]
+                evento.content = row.get("content")
+            _adicionar(evento.requester_names, row.get("requester_name"))
+            _adicionar(evento.technician_names, row.get("technician_name"))
+            _adicionar(evento.recipients, row.get(campos["recipient"]))
+        return prontos
+
+    def finalizar(self):
+        """Retorna o último evento, ainda aberto, se houver."""
+        evento, self._atual = self._atual, None
+        return [evento] if evento is not None else []
@@ -0,0 +1,216 @@
+import hashlib
+import html
+import re
+import threading
+from collections import Counter, OrderedDict
+from html.entities import html5
+from html.parser import HTMLParser
+
+# Mesmas regras de árvore do BeautifulSoup com "html.parser", para que o
+# texto extraído seja idêntico ao de soup.get_text(separator="\n"). Ficam
+# aqui, e não lidas do bs4, porque os nomes internos mudam entre versões.
+_EMPTY_ELEMENT_TAGS = frozenset(
+    {
+        "area", "base", "basefont", "bgsound", "br", "col", "command", "embed",
+        "frame", "hr", "image", "img", "input", "isindex", "keygen", "link",
+        "menuitem", "meta", "nextid", "param", "source", "spacer", "track", "wbr",
+    }
+)
+_PRESERVE_WHITESPACE_TAGS = frozenset({"pre", "textarea"})
+_STRING_CONTAINER_TAGS = frozenset({"rt", "rp", "style", "script", "template"})
+_ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+_DECIMAL_REFERENCE = re.compile("^([0-9]+)(.*)")
+_HEX_REFERENCE = re.compile("^([0-9a-f]+)(.*)")
+
+
+def _entidades():
+    # Nome sem ";" -> caractere; entre as grafias de um mesmo nome vale a
+    # primeira em ordem alfabética, como no BeautifulSoup
+    entidades = {}
+    for nome, caractere in sorted(html5.items()):
+        entidades.setdefault(nome.rstrip(";"), caractere)
+    return entidades
+
+
+_ENTIDADES = _entidades()
+
+
+def _referencia_numerica(numeric):
+    """Caractere de ``&#N;`` pelas regras do HTML5 (as mesmas do BeautifulSoup)."""
+    if numeric == 0 or numeric > 0x10FFFF or 0xD800 <= numeric <= 0xDFFF:
+        return "\ufffd"
+    if 0x80 <= numeric <= 0x9F:
+        # Referências de controle C1 escritas com o código do Windows-1252
+        try:
+            return bytes([numeric]).decode("cp1252")
+        except UnicodeDecodeError:
+            pass
+    return chr(numeric)
+
+
+class _TextExtractor(HTMLParser):
+    """Extrai os trechos de texto de um HTML sem montar a árvore do documento.
+
+    Só é mantida a pilha de nomes de tags abertas, suficiente para saber
+    quando o espaço em branco deve ser preservado (``pre``/``textarea``) e
+    quando o texto pertence a ``script``, ``style`` e afins, que o
+    BeautifulSoup não inclui em ``get_text``.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.strings = []
+        self._data = []
+        self._stack = []
+        self._open = Counter()
+        self._preserve = 0
+        self._containers = 0
+        self._already_closed = []
+
+    def _end_data(self, cdata=False):
+        if not self._data:
+            return
+        data = "".join(self._data)
+        self._data = []
+        if not self._preserve and not data.strip(_ASCII_SPACES):
+            data = "\n" if "\n" in data else " "
+        if cdata or not self._containers:
+            self.strings.append(data)
+
+    def _push(self, tag):
+        self._stack.append(tag)
+        self._open[tag] += 1
+        if tag in _PRESERVE_WHITESPACE_TAGS:
+            self._preserve += 1
+        if tag in _STRING_CONTAINER_TAGS:
+            self._containers += 1
+
+    def _pop_to(self, tag):
+        if not self._open[tag]:
+            return
+        while self._stack:
+            popped = self._stack.pop()
+            self._open[popped] -= 1
+            if popped in _PRESERVE_WHITESPACE_TAGS:
+                self._preserve -= 1
+            if popped in _STRING_CONTAINER_TAGS:
+                self._containers -= 1
+            if popped == tag:
+                return
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        self._end_data()
+        self._push(tag)
+        if handle_empty_element and tag in _EMPTY_ELEMENT_TAGS:
+            self.handle_endtag(tag, check_already_closed=False)
+            self._already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag, check_already_closed=False)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self._already_closed:
+            self._already_closed.remove(tag)
+            return
+        self._end_data()
+        self._pop_to(tag)
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_charref(self, name):
+        base, pattern = 10, _DECIMAL_REFERENCE
+        if name.startswith(("x", "X")):
+            name, base, pattern = name[1:], 16, _HEX_REFERENCE
+        numeric, extra = None, ""
+        try:
+            numeric = int(name, base)
+        except ValueError:
+            match = pattern.search(name)
+            if match is not None:
+                numeric, extra = int(match.group(1), base), match.group(2)
+        if numeric is None:
+            self._data.append(name)
+            return
+        self._data.append(_referencia_numerica(numeric))
+        self._data.append(extra)
+
+    def handle_entityref(self, name):
+        character = _ENTIDADES.get(name)
+        self._data.append(character if character is not None else f"&{name}")
+
+    def handle_comment(self, data):
+        self._end_data()
+
+    handle_decl = handle_pi = handle_comment
+
+    def unknown_decl(self, data):
+        self._end_data()
+        if data.upper().startswith("CDATA["):
+            self._data.append(data[len("CDATA[") :])
+            self._end_data(cdata=True)
+
+    def close(self):
+        super().close()
+        self._end_data()
+
+
+def _extrair_texto(text):
+    parser = _TextExtractor()
+    parser.feed(html.unescape(text))
+    parser.close()
+    return "\n".join(parser.strings).strip()
+
+
+class HtmlTextNormalizer:
+    """Converte o HTML do GLPI em texto simples, com cache LRU.
+
+    O cache é indexado pelo hash do conteúdo, então o mesmo ``content`` de
+    um ticket que reaparece em vários ciclos ou linhas é processado uma vez.
+    """
+
+    def __init__(self, cache_size=2048):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def normalize(self, text, max_length=None):
+        """Retorna o texto sem tags, truncado em ``max_length`` caracteres."""
+        if not text:
+            return ""
+        chave = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            texto = self._cache.get(chave)
+            if texto is not None:
+                self._cache.move_to_end(chave)
+                self.hits += 1
+        if texto is None:
+            texto = _extrair_texto(text)
+            with self._lock:
+                self.misses += 1
+                self._cache[chave] = texto
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        if max_length is not None and len(texto) > max_length:
+            return texto[: max_length - 1].rstrip() + "…"
+        return texto
+
+    def cache_info(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._cache),
+                "max_size": self.cache_size,
+            }
+
+
+_normalizer = HtmlTextNormalizer()
+
+
+def html_para_texto(text, max_length=None):
+    """Converte HTML em texto usando o normalizador compartilhado."""
+    return _normalizer.normalize(text, max_length)
@@ -0,0 +1,253 @@
+import hashlib
+import logging
+import math
+import threading
+
+import pymysql
+
+from services import metricas
+
+
+def _prefixo_lock(prefixo):
+    # Nomes de lock do MySQL têm no máximo 64 caracteres
+    if len(prefixo) <= 40:
+        return prefixo
+    return "dbm:" + hashlib.blake2b(prefixo.encode(), digest_size=12).hexdigest()
+
+
+class LeaderElection:
+    """Divide os tipos de evento entre réplicas com ``GET_LOCK`` do MySQL.
+
+    Cada réplica abre uma conexão própria que segura os locks: um de
+    presença (``replica:N``), usado para contar as réplicas vivas, e um por
+    tipo de evento que ela assumiu. A cada rodada a réplica fica com a sua
+    cota (tipos / réplicas vivas): assume tipos livres até a cota e libera
+    os excedentes que não estejam rodando, para uma réplica nova pegar.
+
+    Quando uma réplica morre, o servidor solta os locks da conexão dela e
+    as outras assumem na rodada seguinte. A conexão usa ``wait_timeout``
+    curto como lease: se o processo travar por inteiro, o servidor derruba
+    a conexão ociosa e libera os locks.
+    """
+
+    def __init__(
+        self, db_config, prefixo, tipos, intervalo=5.0, max_replicas=16, tenant=""
+    ):
+        self.db_config = db_config
+        self.tenant = tenant
+        self.tipos = list(tipos)
+        self.intervalo = intervalo
+        self.max_replicas = max_replicas
+        self._prefixo = _prefixo_lock(prefixo)
+        self._conn = None
+        self._mutex = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self.slot = None
+        self.lider = set()
+        self.trocas = 0
+
+    def _publicar(self):
+        for tipo in self.tipos:
+            metricas.LEADER.set(
+                1 if tipo in self.lider else 0, tenant=self.tenant, event_type=tipo
+            )
+
+    def _nome(self, sufixo):
+        return f"{self._prefixo}:{sufixo}"
+
+    def _consultar(self, sql, params=()):
+        with self._conn.cursor(pymysql.cursors.DictCursor) as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def _conectar(self):
+        if self._conn is not None:
+            self._conn.ping(reconnect=False)
+            return
+        self._conn = pymysql.connect(**self.db_config)
+        lease = max(10, int(self.intervalo * 6))
+        self._consultar(f"SET SESSION wait_timeout = {lease}")
+
+    def _perder_conexao(self):
+        """Fecha a conexão; o servidor solta todos os locks dela."""
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except pymysql.MySQLError:
+                pass
+        self._conn = None
+        self.slot = None
+        if self.lider:
+            logging.warning(f"Liderança perdida: {sorted(self.lider)}")
+            self.lider = set()
+        self._publicar()
+
+    def _registrar(self):
+        """Pega o primeiro slot de presença livre."""
+        for slot in range(self.max_replicas):
+            row = self._consultar(
+                "SELECT GET_LOCK(%s, 0) AS ok", (self._nome(f"replica:{slot}"),)
+            )[0]
+            if row["ok"] == 1:
+                self.slot = slot
+                logging.info(f"Réplica registrada no slot {slot}")
+                return
+        raise RuntimeError(f"Mais de {self.max_replicas} réplicas ativas")
+
+    def _replicas_vivas(self):
+        colunas = ", ".join(
+            f"IS_USED_LOCK(%s) AS s{slot}" for slot in range(self.max_replicas)
+        )
+        nomes = tuple(self._nome(f"replica:{slot}") for slot in range(self.max_replicas))
+        row = self._consultar(f"SELECT {colunas}", nomes)[0]
+        return sum(1 for valor in row.values() if valor is not None)
+
+    def atualizar(self, ocupados=()):
+        """Faz uma rodada de eleição. Retorna os tipos assumidos nela.
+
+        ``ocupados`` são os tipos com tarefa em execução, que não podem
+        ser liberados agora.
+        """
+        with self._mutex:
+            try:
+                self._conectar()
+                if self.slot is None:
+                    self._registrar()
+                cota = math.ceil(len(self.tipos) / max(1, self._replicas_vivas()))
+                # Cada slot prefere tipos diferentes, para dividir sem disputa
+                inicio = self.slot % len(self.tipos)
+                ordem = self.tipos[inicio:] + self.tipos[:inicio]
+                for tipo in reversed(ordem):
+                    if len(self.lider) <= cota:
+                        break
+                    if tipo in self.lider and tipo not in ocupados:
+                        self._consultar("SELECT RELEASE_LOCK(%s)", (self._nome(tipo),))
+                        self.lider.discard(tipo)
+                        logging.info(f"Tipo {tipo} liberado para outra réplica")
+                assumidos = []
+                for tipo in ordem:
+                    if len(self.lider) >= cota:
+                        break
+                    if tipo in self.lider:
+                        continue
+                    row = self._consultar(
+                        "SELECT GET_LOCK(%s, 0) AS ok", (self._nome(tipo),)
+                    )[0]
+                    if row["ok"] == 1:
+                        self.lider.add(tipo)
+                        self.trocas += 1
+                        assumidos.append(tipo)
+                        logging.info(f"Réplica {self.slot} assumiu {tipo}")
+                self._publicar()
+                return assumidos
+            except (pymysql.MySQLError, RuntimeError) as e:
+                logging.error(f"Erro na eleição de líder: {e}")
+                self._perder_conexao()
+                return []
+
+    def _confirmar_dono(self, tipo):
+        row = self._consultar(
+            "SELECT IS_USED_LOCK(%s) = CONNECTION_ID() AS dono", (self._nome(tipo),)
+        )[0]
+        if not row["dono"]:
+            logging.warning(f"Réplica {self.slot} não é mais líder de {tipo}")
+            self.lider.discard(tipo)
+            self._publicar()
+            return False
+        return True
+
+    def e_lider(self, tipo):
+        """Confere no servidor se esta réplica ainda segura o lock do tipo."""
+        if tipo not in self.lider:
+            return False
+        with self._mutex:
+            try:
+                self._conectar()
+                return self._confirmar_dono(tipo)
+            except pymysql.MySQLError as e:
+                logging.error(f"Erro ao conferir liderança de {tipo}: {e}")
+                self._perder_conexao()
+                return False
+
+    def executar_se_lider(self, tipo, sql, params=()):
+        """Executa ``sql`` só se ainda for líder de ``tipo``. Retorna se executou.
+
+        A conferência e a escrita usam a conexão dos locks sob o mesmo
+        mutex, para uma réplica que perdeu a liderança não gravar.
+        """
+        return self.executar_lote_se_lider(tipo, [(sql, params)]) is not None
+
+    def executar_lote_se_lider(self, tipo, comandos):
+        """Executa os comandos ``(sql, params)`` só se ainda for líder de ``tipo``.
+
+        Retorna as linhas de cada comando, ou None se não for mais líder.
+        Todos rodam após a mesma conferência, sem soltar o mutex.
+        """
+        with self._mutex:
+            if tipo not in self.lider:
+                return None
+            try:
+                self._conectar()
+                if not self._confirmar_dono(tipo):
+                    return None
+                return [self._consultar(sql, params) for sql, params in comandos]
+            except pymysql.MySQLError:
+                self._perder_conexao()
+                raise
+
+    def consultar(self, sql, params=()):
+        """Consulta na conexão dos locks (usada pelos checkpoints compartilhados)."""
+        with self._mutex:
+            try:
+                self._conectar()
+                return self._consultar(sql, params)
+            except pymysql.MySQLError:
+                self._perder_conexao()
+                raise
+
+    def tipo_do_lock(self, chave):
+        """Tipo cujo lock protege a chave de checkpoint ``chave``.
+
+        Com um único tipo (modo captura), ele protege todas as chaves.
+        """
+        if chave in self.tipos or len(self.tipos) != 1:
+            return chave
+        return self.tipos[0]
+
+    def abdicar(self, motivo):
+        """Solta todos os locks desta réplica."""
+        with self._mutex:
+            if self._conn is not None:
+                logging.warning(f"Liberando a liderança: {motivo}")
+                self._perder_conexao()
+
+    def iniciar(self, ocupados, ao_assumir, travado=lambda: False):
+        """Roda as eleições a cada ``intervalo`` segundos numa thread própria.
+
+        ``ocupados()`` retorna os tipos em execução, ``ao_assumir(tipo)`` é
+        chamado para cada tipo assumido e, enquanto ``travado()`` for
+        verdadeiro, a réplica abre mão dos locks.
+        """
+
+        def laco():
+            while True:
+                if travado():
+                    self.abdicar("tarefa travada")
+                else:
+                    for tipo in self.atualizar(ocupados()):
+                        ao_assumir(tipo)
+                if self._parar.wait(self.intervalo):
+                    return
+
+        self._thread = threading.Thread(target=laco, name="eleicao", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.abdicar("encerramento")
+
+    def stats(self):
+        return {"slot": self.slot, "lider": sorted(self.lider), "trocas": self.trocas}
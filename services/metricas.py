@@ -0,0 +1,279 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+_COUNT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+
+def _formatar_labels(nomes, valores, extra=None):
+    pares = list(zip(nomes, valores))
+    if extra:
+        pares.append(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{valor}"' for nome, valor in pares) + "}"
+
+
+def _rotulo(chave):
+    return ",".join(valor for valor in chave if valor)
+
+
+class _Metric:
+    tipo = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._valores = {}
+
+    def _chave(self, labels):
+        return tuple(str(labels.get(nome, "")) for nome in self.labelnames)
+
+    def valores(self):
+        """Cópia dos valores atuais, por rótulos separados por vírgula."""
+        with self._lock:
+            return {_rotulo(chave): valor for chave, valor in self._valores.items()}
+
+    def exposicao(self):
+        linhas = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.tipo}",
+        ]
+        with self._lock:
+            itens = list(self._valores.items())
+        for chave, valor in itens:
+            linhas.extend(self._linhas(chave, valor))
+        return linhas
+
+
+class Counter(_Metric):
+    tipo = "counter"
+
+    def inc(self, valor=1, **labels):
+        chave = self._chave(labels)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def _linhas(self, chave, valor):
+        return [f"{self.name}{_formatar_labels(self.labelnames, chave)} {valor}"]
+
+
+class Gauge(_Metric):
+    tipo = "gauge"
+
+    def set(self, valor, **labels):
+        with self._lock:
+            self._valores[self._chave(labels)] = valor
+
+    def _linhas(self, chave, valor):
+        return [f"{self.name}{_formatar_labels(self.labelnames, chave)} {valor}"]
+
+
+class Histogram(_Metric):
+    tipo = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, valor, **labels):
+        chave = self._chave(labels)
+        with self._lock:
+            estado = self._valores.get(chave)
+            if estado is None:
+                estado = self._valores[chave] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    estado[0][i] += 1
+                    break
+            estado[1] += valor
+            estado[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Mede a duração do bloco com ``time.perf_counter``."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - inicio, **labels)
+
+    def _linhas(self, chave, estado):
+        contagens, soma, total = estado
+        linhas = []
+        acumulado = 0
+        for limite, contagem in zip(self.buckets, contagens):
+            acumulado += contagem
+            labels = _formatar_labels(self.labelnames, chave, ("le", limite))
+            linhas.append(f"{self.name}_bucket{labels} {acumulado}")
+        labels = _formatar_labels(self.labelnames, chave, ("le", "+Inf"))
+        linhas.append(f"{self.name}_bucket{labels} {total}")
+        labels = _formatar_labels(self.labelnames, chave)
+        linhas.append(f"{self.name}_sum{labels} {soma}")
+        linhas.append(f"{self.name}_count{labels} {total}")
+        return linhas
+
+    def quantil(self, q, **labels):
+        """Estima o quantil ``q`` pelos buckets, como o ``histogram_quantile``.
+
+        Sem ``labels``, considera as observações de todos os rótulos.
+        """
+        with self._lock:
+            if labels:
+                estados = [self._valores.get(self._chave(labels))]
+            else:
+                estados = list(self._valores.values())
+            contagens = [0] * len(self.buckets)
+            total = 0
+            for estado in estados:
+                if estado is None:
+                    continue
+                for i, contagem in enumerate(estado[0]):
+                    contagens[i] += contagem
+                total += estado[2]
+        if not total:
+            return None
+        alvo = q * total
+        acumulado = 0
+        anterior = 0.0
+        for limite, contagem in zip(self.buckets, contagens):
+            if contagem and acumulado + contagem >= alvo:
+                return anterior + (limite - anterior) * (alvo - acumulado) / contagem
+            acumulado += contagem
+            anterior = limite
+        return self.buckets[-1]
+
+    def resumo(self):
+        """Retorna ``{labels: (quantidade, média)}`` para o dump periódico."""
+        with self._lock:
+            return {
+                _rotulo(chave) or "total": (
+                    total,
+                    round(soma / total, 4) if total else 0,
+                )
+                for chave, (_, soma, total) in self._valores.items()
+            }
+
+
+QUERY_SECONDS = Histogram(
+    "glpi_monitor_query_seconds",
+    "Tempo de execução e leitura das consultas de eventos",
+    ("tenant", "event_type"),
+)
+QUERY_ROWS = Histogram(
+    "glpi_monitor_query_rows",
+    "Linhas retornadas por consulta de eventos",
+    ("tenant", "event_type"),
+    buckets=_COUNT_BUCKETS,
+)
+EVENTS = Counter(
+    "glpi_monitor_events_total", "Eventos encontrados", ("tenant", "event_type")
+)
+NORMALIZE_SECONDS = Histogram(
+    "glpi_monitor_normalize_seconds",
+    "Tempo de conversão HTML -> texto por lote de eventos",
+    ("tenant", "event_type"),
+)
+CYCLE_SECONDS = Histogram(
+    "glpi_monitor_cycle_seconds",
+    "Duração de cada ciclo de busca e notificação",
+    ("tenant", "event_type"),
+)
+LAG_SECONDS = Gauge(
+    "glpi_monitor_lag_seconds",
+    "Atraso entre agora e o evento mais recente visto",
+    ("tenant", "event_type"),
+)
+LEADER = Gauge(
+    "glpi_monitor_leader",
+    "1 se esta réplica é a líder do tipo de evento (modo HA)",
+    ("tenant", "event_type"),
+)
+NOTIFICATION_SECONDS = Histogram(
+    "glpi_monitor_notification_seconds", "Latência das chamadas ao gateway"
+)
+NOTIFICATION_RESPONSES = Counter(
+    "glpi_monitor_notification_responses_total",
+    "Respostas do gateway por status HTTP (erro = falha de rede)",
+    ("status",),
+)
+NOTIFICATION_RETRIES = Counter(
+    "glpi_monitor_notification_retries_total", "Novas tentativas de envio"
+)
+NOTIFICATION_DEFERRED = Counter(
+    "glpi_monitor_notification_deferred_total",
+    "Liberações adiadas pelo limite de envios",
+    ("limite",),
+)
+NOTIFICATION_DIGEST_SIZE = Histogram(
+    "glpi_monitor_notification_digest_size",
+    "Mensagens agrupadas em cada notificação enviada",
+    buckets=(1, 2, 3, 5, 10, 20, 50),
+)
+
+METRICAS = [
+    QUERY_SECONDS,
+    QUERY_ROWS,
+    EVENTS,
+    NORMALIZE_SECONDS,
+    CYCLE_SECONDS,
+    LAG_SECONDS,
+    LEADER,
+    NOTIFICATION_SECONDS,
+    NOTIFICATION_RESPONSES,
+    NOTIFICATION_RETRIES,
+    NOTIFICATION_DEFERRED,
+    NOTIFICATION_DIGEST_SIZE,
+]
+
+
+def exposicao():
+    """Retorna todas as métricas no formato texto do Prometheus."""
+    linhas = []
+    for metrica in METRICAS:
+        linhas.extend(metrica.exposicao())
+    return "\n".join(linhas) + "\n"
+
+
+def resumo():
+    """Resumo compacto (quantidade e média) das latências, para o log."""
+    return {
+        "consultas": QUERY_SECONDS.resumo(),
+        "ciclos": CYCLE_SECONDS.resumo(),
+        "normalizacao": NORMALIZE_SECONDS.resumo(),
+        "notificacoes": NOTIFICATION_SECONDS.resumo(),
+    }
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        corpo = exposicao().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def iniciar_servidor(porta, host="0.0.0.0"):
+    """Sobe o endpoint ``/metrics`` numa thread em segundo plano."""
+    servidor = ThreadingHTTPServer((host, porta), _MetricsHandler)
+    thread = threading.Thread(
+        target=servidor.serve_forever, name="metricas", daemon=True
+    )
+    thread.start()
+    logging.info(
+        f"Métricas disponíveis em http://{host}:{servidor.server_address[1]}/metrics"
+    )
+    return servidor
@@ -0,0 +1,92 @@
+import sqlite3
+import threading
+import time
+import os
+
+
+class NotificationOutbox:
+    """Outbox local (SQLite em modo WAL) das notificações a entregar.
+
+    Cada notificação é gravada com uma chave de idempotência antes de ir
+    para o dispatcher e marcada como entregue quando o gateway responde 200.
+    Chaves repetidas são ignoradas, o que elimina reenvios de eventos já
+    vistos, e as linhas não entregues são reenviadas na inicialização.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        diretorio = os.path.dirname(path)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chave TEXT NOT NULL UNIQUE,
+                mensagem TEXT NOT NULL,
+                phone TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                entregue_em REAL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_pendentes ON outbox (entregue_em, id)"
+        )
+        self._conn.commit()
+
+    def adicionar_lote(self, itens):
+        """Grava as notificações ``(chave, mensagem, phone)`` numa transação.
+
+        Retorna ``(id, mensagem, phone)`` apenas das chaves ainda não vistas.
+        """
+        novos = []
+        agora = time.time()
+        with self._lock, self._conn:
+            for chave, mensagem, phone in itens:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO outbox (chave, mensagem, phone, criado_em) "
+                    "VALUES (?, ?, ?, ?)",
+                    (chave, mensagem, str(phone), agora),
+                )
+                if cursor.rowcount:
+                    novos.append((cursor.lastrowid, mensagem, phone))
+        return novos
+
+    def marcar_entregue(self, outbox_id):
+        """Marca como entregue um id, ou uma lista de ids de um resumo."""
+        ids = outbox_id if isinstance(outbox_id, (list, tuple)) else [outbox_id]
+        agora = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE outbox SET entregue_em = ? WHERE id = ?",
+                [(agora, item) for item in ids],
+            )
+
+    def pendentes(self):
+        """Retorna as notificações ainda não entregues, em ordem de inserção."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, mensagem, phone FROM outbox "
+                "WHERE entregue_em IS NULL ORDER BY id"
+            ).fetchall()
+
+    def compactar(self, retencao_dias=7):
+        """Remove entregas antigas e expira pendências mais velhas que a retenção.
+
+        Retorna o número de linhas apagadas.
+        """
+        limite = time.time() - retencao_dias * 86400
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM outbox WHERE criado_em < ?", (limite,)
+            )
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
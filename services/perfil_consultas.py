@@ -0,0 +1,314 @@
+import logging
+import statistics
+import time
+
+import pymysql
+
+# Aliases das consultas do monitor -> tabelas do GLPI
+TABELAS = {
+    "t": "glpi_tickets",
+    "f": "glpi_itilfollowups",
+    "v": "glpi_ticketvalidations",
+    "s": "glpi_itilsolutions",
+    "req_tu": "glpi_tickets_users",
+    "tech_tu": "glpi_tickets_users",
+}
+
+# Índices sugeridos por tipo de evento: (alias, nome, colunas). O InnoDB
+# acrescenta a chave primária a todo índice secundário, então filtro e
+# ordenação (..., id) saem do índice sem filesort.
+SUGESTOES = {
+    "tickets": [("t", "idx_dbm_date_creation", ("date_creation",))],
+    "closures": [("t", "idx_dbm_status_date_mod", ("status", "date_mod"))],
+    "validations": [
+        ("v", "idx_dbm_tickets_status", ("tickets_id", "status")),
+        ("v", "idx_dbm_status", ("status",)),
+    ],
+    "followups": [
+        (
+            "f",
+            "idx_dbm_itemtype_private_date",
+            ("itemtype", "is_private", "date_creation"),
+        )
+    ],
+}
+
+
+class _PosicoesFixas:
+    """Checkpoints em memória, para montar as consultas do modo incremental."""
+
+    def __init__(self):
+        self._posicoes = {}
+
+    def get(self, tipo):
+        return self._posicoes.get(tipo)
+
+    def avancar(self, tipo, posicao):
+        self._posicoes[tipo] = posicao
+
+    def confirmar(self, tipo=None):
+        pass
+
+
+def _handler_reads(cursor):
+    cursor.execute("SHOW SESSION STATUS LIKE 'Handler_read%'")
+    return sum(int(row["Value"]) for row in cursor.fetchall())
+
+
+def alertas_do_plano(plano):
+    """Sinaliza, por linha do ``EXPLAIN``, varreduras e ordenações caras."""
+    alertas = []
+    for linha in plano:
+        tabela = linha.get("table")
+        extra = linha.get("Extra") or ""
+        if linha.get("type") == "ALL":
+            alertas.append((tabela, f"varredura completa de {tabela}"))
+        elif linha.get("type") == "index":
+            alertas.append(
+                (tabela, f"varredura completa do índice {linha.get('key')} de {tabela}")
+            )
+        if "Using filesort" in extra:
+            alertas.append((tabela, f"filesort em {tabela}"))
+        if "Using temporary" in extra:
+            alertas.append((tabela, f"tabela temporária em {tabela}"))
+    return alertas
+
+
+def explicar(cursor, sql, params):
+    """Retorna as linhas do ``EXPLAIN`` da consulta."""
+    cursor.execute("EXPLAIN " + sql.strip().rstrip(";"), params)
+    return cursor.fetchall()
+
+
+def analisar(cursor, sql, params):
+    """``EXPLAIN ANALYZE`` (MySQL 8) ou ``ANALYZE FORMAT=JSON`` (MariaDB).
+
+    Executa a consulta de novo; retorna o plano com os tempos reais como
+    texto, ou None se o servidor não suportar nenhum dos dois.
+    """
+    sql = sql.strip().rstrip(";")
+    for prefixo in ("EXPLAIN ANALYZE ", "ANALYZE FORMAT=JSON "):
+        try:
+            cursor.execute(prefixo + sql, params)
+        except pymysql.MySQLError:
+            continue
+        return "\n".join(
+            str(valor) for row in cursor.fetchall() for valor in row.values()
+        )
+    return None
+
+
+def medir(conn, sql, params):
+    """Executa a consulta e mede tempo, linhas retornadas e examinadas.
+
+    As linhas são só contadas (cursor sem buffer), sem ficar em memória.
+    """
+    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+        # Custo do próprio SHOW STATUS, descontado da medição
+        base = _handler_reads(cursor)
+        custo = _handler_reads(cursor) - base
+        antes = _handler_reads(cursor)
+    with conn.cursor(pymysql.cursors.SSDictCursor) as cursor:
+        inicio = time.perf_counter()
+        cursor.execute(sql, params)
+        linhas = sum(1 for _ in cursor)
+        segundos = time.perf_counter() - inicio
+    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+        examinadas = max(0, _handler_reads(cursor) - antes - custo)
+    return {"segundos": segundos, "linhas": linhas, "examinadas": examinadas}
+
+
+def montar_consultas(monitor, janela_minutos):
+    """Monta ``(event_type, modo, sql, params)`` das consultas do monitor.
+
+    O modo incremental parte da posição que o monitor usaria sem
+    checkpoint salvo (o início da janela). Os checkpoints do monitor não
+    são alterados.
+    """
+    consultas = []
+    original = monitor.checkpoints
+    conn = monitor.pool.acquire(timeout=30)
+    try:
+        with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+            for modo, checkpoints in (("janela", None), ("incremental", _PosicoesFixas())):
+                monitor.checkpoints = checkpoints
+                for event_type in SUGESTOES:
+                    build_query = monitor.query_builder(event_type)
+                    sql, params = build_query(cursor, janela_minutos).render()
+                    consultas.append((event_type, modo, sql, params))
+    finally:
+        monitor.checkpoints = original
+        monitor.pool.release(conn)
+    return consultas
+
+
+def indices_existentes(cursor, tabela):
+    """Colunas de cada índice da tabela, na ordem do índice."""
+    cursor.execute(
+        "SELECT index_name, column_name FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s "
+        "ORDER BY index_name, seq_in_index",
+        (tabela,),
+    )
+    indices = {}
+    for row in cursor.fetchall():
+        valores = {chave.lower(): valor for chave, valor in row.items()}
+        indices.setdefault(valores["index_name"], []).append(valores["column_name"])
+    return indices
+
+
+def sugerir_indices(cursor, event_type, alertas):
+    """Índices sugeridos para as tabelas sinalizadas que ainda não existem.
+
+    Um índice existente cujas primeiras colunas são as sugeridas já
+    atende. Retorna ``[(tabela, nome, colunas)]``.
+    """
+    sinalizadas = {alias for alias, _ in alertas}
+    sugestoes = []
+    for alias, nome, colunas in SUGESTOES.get(event_type, []):
+        if alias not in sinalizadas:
+            continue
+        tabela = TABELAS[alias]
+        existentes = indices_existentes(cursor, tabela).values()
+        if any(tuple(indice[: len(colunas)]) == colunas for indice in existentes):
+            continue
+        sugestoes.append((tabela, nome, colunas))
+    return sugestoes
+
+
+def ddl_indice(tabela, nome, colunas):
+    return (
+        f"ALTER TABLE {tabela} ADD INDEX {nome} ({', '.join(colunas)}), "
+        "ALGORITHM=INPLACE, LOCK=NONE"
+    )
+
+
+def perfilar(monitor, janela_minutos=60, com_analise=False):
+    """Perfila as consultas do monitor e retorna um relatório por consulta.
+
+    Cada tipo de evento é consultado nos modos janela de tempo e
+    incremental, com ``EXPLAIN`` e execução cronometrada. As linhas
+    examinadas vêm dos contadores ``Handler_read_*`` da sessão, que
+    funcionam igual no MySQL e no MariaDB. Com ``com_analise`` também
+    guarda o ``EXPLAIN ANALYZE``, que executa a consulta mais uma vez.
+    """
+    relatorio = []
+    for event_type, modo, sql, params in montar_consultas(monitor, janela_minutos):
+        with monitor.pool.connection(timeout=30) as conn:
+            medicao = medir(conn, sql, params)
+            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                plano = explicar(cursor, sql, params)
+                alertas = alertas_do_plano(plano)
+                examinadas, linhas = medicao["examinadas"], max(medicao["linhas"], 1)
+                if plano and examinadas > 1000 and examinadas / linhas > 100:
+                    # O índice usado filtra pouco: a tabela que guia a junção é
+                    # a primeira do plano
+                    tabela = plano[0].get("table")
+                    alertas.append((tabela, f"baixa seletividade em {tabela}"))
+                sugestoes = sugerir_indices(cursor, event_type, alertas)
+                analise = analisar(cursor, sql, params) if com_analise else None
+        relatorio.append(
+            {
+                "event_type": event_type,
+                "modo": modo,
+                **medicao,
+                "plano": plano,
+                "alertas": [texto for _, texto in alertas],
+                "sugestoes": sugestoes,
+                "analise": analise,
+            }
+        )
+    return relatorio
+
+
+def imprimir(relatorio, detalhado=False):
+    print(
+        f"{'tipo':<12} {'modo':<12} {'tempo':>9} {'retornadas':>11} "
+        f"{'examinadas':>11} {'exam/ret':>9}  alertas"
+    )
+    for item in relatorio:
+        razao = item["examinadas"] / max(item["linhas"], 1)
+        print(
+            f"{item['event_type']:<12} {item['modo']:<12} "
+            f"{item['segundos'] * 1000:>7.1f}ms {item['linhas']:>11} "
+            f"{item['examinadas']:>11} {razao:>9.1f}  "
+            f"{'; '.join(item['alertas']) or '-'}"
+        )
+        if detalhado:
+            for linha in item["plano"]:
+                print(
+                    f"    {linha.get('table')}: type={linha.get('type')} "
+                    f"key={linha.get('key')} rows={linha.get('rows')} "
+                    f"extra={linha.get('Extra') or ''}"
+                )
+            if item["analise"]:
+                print("    " + item["analise"].replace("\n", "\n    "))
+    sugestoes = sorted({s for item in relatorio for s in item["sugestoes"]})
+    if sugestoes:
+        print("\nÍndices sugeridos:")
+        for sugestao in sugestoes:
+            print(f"  {ddl_indice(*sugestao)};")
+    return sugestoes
+
+
+def aplicar_indices(monitor, sugestoes, confirmar=input):
+    """Cria os índices sugeridos, um a um, após confirmação explícita.
+
+    ``ALGORITHM=INPLACE, LOCK=NONE`` mantém a tabela disponível para
+    escrita durante a criação; o servidor recusa o comando se não puder.
+    """
+    for sugestao in sugestoes:
+        ddl = ddl_indice(*sugestao)
+        resposta = confirmar(f"{ddl}\nDigite 'sim' para criar este índice: ")
+        if resposta.strip().lower() != "sim":
+            print("Ignorado")
+            continue
+        with monitor.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                inicio = time.perf_counter()
+                cursor.execute(ddl)
+        print(f"Índice {sugestao[1]} criado em {time.perf_counter() - inicio:.1f}s")
+
+
+def _registrar_lenta(conn, event_type, modo, sql, params, medicao, mediana):
+    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+        alertas = alertas_do_plano(explicar(cursor, sql, params))
+    referencia = f"{mediana * 1000:.0f}ms" if mediana is not None else "-"
+    plano = "; ".join(texto for _, texto in alertas) or "sem alertas no plano"
+    logging.warning(
+        f"Consulta lenta: {event_type} ({modo}) em {medicao['segundos'] * 1000:.0f}ms "
+        f"(mediana {referencia}), {medicao['examinadas']} linhas examinadas para "
+        f"{medicao['linhas']} retornadas; {plano}"
+    )
+
+
+def amostrar(monitor, intervalo, janela_minutos=60, limite_segundos=10.0, regressao=2.0):
+    """Reexecuta as consultas a cada ``intervalo`` segundos, até Ctrl+C.
+
+    Registra no log as consultas acima de ``limite_segundos`` ou
+    ``regressao`` vezes mais lentas que a mediana das amostras
+    anteriores, com o plano de execução do momento, para identificar qual
+    busca piorou (após uma atualização do GLPI, por exemplo).
+    """
+    historico = {}
+    try:
+        while True:
+            for event_type, modo, sql, params in montar_consultas(monitor, janela_minutos):
+                anteriores = historico.setdefault((event_type, modo), [])
+                mediana = statistics.median(anteriores) if anteriores else None
+                with monitor.pool.connection(timeout=30) as conn:
+                    medicao = medir(conn, sql, params)
+                    segundos = medicao["segundos"]
+                    # Piso de 50ms para variações normais em consultas rápidas
+                    piorou = mediana is not None and segundos > max(
+                        mediana * regressao, 0.05
+                    )
+                    if segundos > limite_segundos or piorou:
+                        _registrar_lenta(
+                            conn, event_type, modo, sql, params, medicao, mediana
+                        )
+                anteriores.append(segundos)
+                del anteriores[:-50]
+            time.sleep(intervalo)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import pymysql
+
+
+class ConnectionPool:
+    """Pool limitado de conexões pymysql reaproveitadas entre as consultas.
+
+    Cada conexão devolvida ao pool guarda o instante do último uso. Ao ser
+    retirada passa por um ``ping``; conexões paradas há mais de
+    ``max_idle_seconds`` são descartadas. Quando o MySQL está fora do ar a
+    abertura de novas conexões é repetida com backoff exponencial.
+    """
+
+    def __init__(
+        self,
+        db_config,
+        size=4,
+        max_idle_seconds=300,
+        max_retries=5,
+        backoff_base=1.0,
+        backoff_max=30.0,
+    ):
+        self.db_config = db_config
+        self.size = size
+        self.max_idle_seconds = max_idle_seconds
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "created": 0,
+            "reconnects": 0,
+            "evicted_idle": 0,
+            "connect_failures": 0,
+            "in_use": 0,
+        }
+
+    def _incr(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def _connect(self):
+        """Abre uma conexão nova, repetindo com backoff em caso de falha."""
+        attempt = 0
+        while True:
+            try:
+                conn = pymysql.connect(**self.db_config)
+                self._incr("created")
+                return conn
+            except pymysql.MySQLError as e:
+                self._incr("connect_failures")
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+                logging.warning(
+                    f"Falha ao conectar ao banco ({e}), nova tentativa em {delay:.1f}s"
+                )
+                time.sleep(delay)
+
+    def _take_idle(self):
+        """Retira uma conexão ociosa saudável, descartando as expiradas."""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                conn, last_used = self._idle.pop()
+            if time.monotonic() - last_used > self.max_idle_seconds:
+                self._incr("evicted_idle")
+                self._close_quietly(conn)
+                continue
+            try:
+                conn.ping(reconnect=False)
+                return conn
+            except pymysql.MySQLError:
+                self._incr("reconnects")
+                self._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except pymysql.MySQLError:
+            pass
+
+    def acquire(self, timeout=None):
+        """Retira uma conexão do pool, aguardando se todas estiverem em uso."""
+        if not self._slots.acquire(blocking=False):
+            self._incr("waits")
+            if not self._slots.acquire(timeout=timeout if timeout is not None else -1):
+                raise TimeoutError("Nenhuma conexão livre no pool")
+        try:
+            conn = self._take_idle() or self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        """Devolve a conexão ao pool (ou a fecha, se ``discard``)."""
+        if discard or not conn.open:
+            self._close_quietly(conn)
+        else:
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        with self._lock:
+            self._stats["in_use"] -= 1
+        self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.acquire(timeout)
+        discard = False
+        try:
+            yield conn
+        except pymysql.OperationalError:
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def stats(self):
+        """Retorna os contadores do pool."""
+        with self._lock:
+            return {**self._stats, "idle": len(self._idle), "size": self.size}
+
+    def close(self):
+        """Fecha todas as conexões ociosas."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close_quietly(conn)
@@ -0,0 +1,99 @@
+from datetime import datetime
+
+from monitor import EventQuery, _keyset
+from services.eventos import EventAggregator
+
+CHAVES_FECHAMENTO = (("t.date_mod", "date_mod"), ("t.id", "id"))
+
+
+def _consulta(keys=CHAVES_FECHAMENTO, descending=False):
+    return EventQuery("SELECT t.id FROM glpi_tickets AS t", "t.status = %s", (6,), keys, descending)
+
+
+def _fechamento(ticket, solucao, solicitante, telefone):
+    return {
+        "id": ticket,
+        "name": f"t{ticket}",
+        "date_mod": datetime(2024, 1, 1, 8, 0),
+        "solution_id": solucao,
+        "content": f"sol{ticket}-{solucao}",
+        "requester_name": solicitante,
+        "technician_name": "Técnico",
+        "phone": telefone,
+    }
+
+
+def test_keyset_chave_simples():
+    assert _keyset((("v.id", "validation_id"),), (10,), False, True) == ("v.id >= %s", (10,))
+    assert _keyset((("v.id", "validation_id"),), (10,), False, False) == ("v.id > %s", (10,))
+    assert _keyset((("v.id", "validation_id"),), (10,), True, False) == ("v.id < %s", (10,))
+
+
+def test_keyset_chave_composta():
+    condicao, params = _keyset(CHAVES_FECHAMENTO, ("2024-01-01", 7), False, True)
+    assert condicao == "(t.date_mod > %s OR (t.date_mod = %s AND t.id >= %s))"
+    assert params == ("2024-01-01", "2024-01-01", 7)
+
+    condicao, params = _keyset(CHAVES_FECHAMENTO, ("2024-01-01", 7), True, False)
+    assert condicao == "(t.date_mod < %s OR (t.date_mod = %s AND t.id < %s))"
+    assert params == ("2024-01-01", "2024-01-01", 7)
+
+
+def test_render_sem_posicao():
+    sql, params = _consulta().render()
+    assert "WHERE t.status = %s" in sql
+    assert sql.endswith("ORDER BY t.date_mod ASC, t.id ASC")
+    assert params == (6,)
+
+
+def test_render_com_posicao_e_limite():
+    sql, params = _consulta(descending=True).render(("2024-01-01", 7), 5, inclusive=False)
+    assert "WHERE (t.status = %s) AND (t.date_mod < %s OR (t.date_mod = %s AND t.id < %s))" in sql
+    assert sql.endswith("ORDER BY t.date_mod DESC, t.id DESC LIMIT 5")
+    assert params == (6, "2024-01-01", "2024-01-01", 7)
+
+
+def test_render_event_le_o_evento_inteiro():
+    sql, params = _consulta().render_event(("2024-01-01", 7))
+    assert "WHERE (t.status = %s) AND t.date_mod = %s AND t.id = %s" in sql
+    assert "LIMIT" not in sql
+    assert params == (6, "2024-01-01", 7)
+
+
+def test_key_segue_as_colunas_da_consulta():
+    assert _consulta().key(_fechamento(7, 1, "Ana", "551")) == (datetime(2024, 1, 1, 8, 0), 7)
+
+
+def test_agregador_junta_evento_dividido_entre_lotes():
+    linhas = [
+        _fechamento(1, solucao, solicitante, telefone)
+        for solucao in (1, 3, 2)
+        for solicitante, telefone in (("Ana", "551"), ("Bia", "552"))
+    ] + [_fechamento(2, 4, "Ana", "551")]
+    agregador = EventAggregator("closures")
+
+    assert agregador.adicionar(linhas[:4]) == []
+    # A página seguinte relê as linhas do último evento
+    prontos = agregador.adicionar(linhas[2:])
+    assert [evento.item_id for evento in prontos] == [1]
+    evento = prontos[0]
+    assert evento.solution_id == 3
+    assert evento.content == "sol1-3"
+    assert evento.requester_names == ["Ana", "Bia"]
+    assert evento.technician_names == ["Técnico"]
+    assert evento.recipients == ["551", "552"]
+
+    ultimo = agregador.finalizar()
+    assert [evento.item_id for evento in ultimo] == [2]
+    assert agregador.finalizar() == []
+
+
+def test_agregador_usa_a_chave_do_tipo():
+    linhas = [
+        {"validation_id": 5, "id": 1, "name": "t1", "date_mod": None, "validator_phone": "551"},
+        {"validation_id": 5, "id": 1, "name": "t1", "date_mod": None, "validator_phone": "551"},
+        {"validation_id": 6, "id": 1, "name": "t1", "date_mod": None, "validator_phone": "552"},
+    ]
+    agregador = EventAggregator("validations")
+    prontos = agregador.adicionar(linhas) + agregador.finalizar()
+    assert [(evento.item_id, evento.recipients) for evento in prontos] == [(5, ["551"]), (6, ["552"])]